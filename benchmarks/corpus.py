@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""Seeded generator of synthetic fumen strings for the benchmarks."""
+
+import random
+
+from py_fumen_py.constant import FieldConstants, FieldConstants110
+from py_fumen_py.field import Field
+from py_fumen_py.fumen_buffer import FumenBufferWriter
+from py_fumen_py.fumen_codec import _write_page, encode
+from py_fumen_py.operation import Mino, Rotation, Operation
+from py_fumen_py.page import Page, Flags, Refs
+from py_fumen_py.quiz import Quiz, _QuizState
+
+_WORDS = ['the', 'T-spin', 'double', 'perfect', 'clear', 'opener', 'hold',
+          'next', 'setup', 'DT', 'cannon', 'TSD', 'TST', '→', '日本語',
+          'ミノ', 'stack', 'flat', 'left', 'right', 'well']
+_MINO_NAMES = 'IOLZTJS'
+
+def _text(rng, words):
+    return ' '.join(rng.choice(_WORDS) for i in range(words))
+
+def _random_operation(rng, field, height, mino=None):
+    # Return a random colored operation dropped on the field, or None
+    for i in range(10):
+        operation = Operation(
+            Mino(rng.randint(1, 7)) if mino is None else mino,
+            Rotation(rng.randrange(4)), rng.randrange(FieldConstants.WIDTH),
+            height - 3
+        )
+        if field.is_placeable(operation):
+            return field.drop(operation, place=False)
+    return None
+
+def generate_pages(rng, page_count, comment_words=0, quiz=False,
+                   repeat_rate=0.0, height=FieldConstants.HEIGHT,
+                   garbage=True):
+    """Return a list of synthetic pages of a game played on the field.
+    Keyword arguments:
+    rng: the random.Random object to use.
+    page_count: the number of pages.
+    comment_words: the number of words in each new comment, 0 for short
+        comments. (default: 0)
+    quiz: if the first comment is a quiz, carried over the pages.
+        (default: False)
+    repeat_rate: the chance of a page without any operation, so that the
+        field repeats. (default: 0.0)
+    height: the lines available to the stack. (default: FieldConstants.HEIGHT)
+    garbage: if the pages may have garbage lines. (default: True)
+    """
+    field = Field()
+    pages = []
+    # The minos of a quiz are placed in the order of its queue
+    queue = [Mino.parse_name(rng.choice(_MINO_NAMES))
+             for i in range(page_count+1)] if quiz else None
+    for i in range(page_count):
+        page_field = field.copy()
+        if garbage and rng.random() < 0.05:
+            hole = rng.randrange(FieldConstants.WIDTH)
+            page_field[-1] = [Mino._ if x == hole else Mino.X
+                              for x in range(FieldConstants.WIDTH)]
+        operation = (None if rng.random() < repeat_rate
+                     else _random_operation(rng, page_field, height,
+                                            queue and queue[i]))
+        if operation is None and height != FieldConstants.HEIGHT:
+            # Empty operations of version 110 cannot be encoded
+            page_field = Field()
+            operation = _random_operation(rng, page_field, height)
+
+        if i == 0 and quiz:
+            comment = ('#Q=[](' + queue[0].name + ')'
+                       + ''.join(mino.name for mino in queue[1:]))
+        elif quiz:
+            # The quiz carried over from the previous page
+            comment = Quiz(pages[-1].comment)
+            if pages[-1].operation is not None:
+                comment.step(pages[-1].operation.mino)
+            comment = str(comment)
+        elif rng.random() < 0.7:
+            comment = None
+        elif comment_words:
+            comment = _text(rng, comment_words)
+        else:
+            comment = _text(rng, rng.randint(1, 4))
+        pages.append(Page(field=page_field, operation=operation,
+                          comment=comment, flags=Flags(), refs=Refs()))
+
+        field = page_field.copy()
+        if operation is not None:
+            field.lock(operation)
+        field.clear_line()
+        if field.height() > height - 4:
+            field = Field()
+    return pages
+
+def encode_110(pages):
+    """Encode the given pages into a version 110 fumen string."""
+    fumen_writer = FumenBufferWriter(FieldConstants110)
+    prev = (_QuizState(''), '', False, Mino._)
+    for page in pages:
+        prev = _write_page(fumen_writer, page, *prev)
+    fumen_writer.move_field_buffer()
+    return fumen_writer.fumen_string(prefix='v110@')
+
+def generate_corpus(seed=0, scale=1):
+    """Return a dict of named lists of synthetic fumen strings.
+    Keyword arguments:
+    seed: the random seed. (default: 0)
+    scale: the multiplier of the number of strings. (default: 1)
+    """
+    rng = random.Random(seed)
+    return {
+        'short': [encode(generate_pages(rng, rng.randint(1, 10)))
+                  for i in range(200*scale)],
+        'long': [encode(generate_pages(rng, rng.randint(200, 400)))
+                 for i in range(4*scale)],
+        'comments': [encode(generate_pages(rng, 30, comment_words=200))
+                     for i in range(10*scale)],
+        'quiz': [encode(generate_pages(rng, 40, quiz=True))
+                 for i in range(20*scale)],
+        'repeats': [encode(generate_pages(rng, 100, repeat_rate=0.9))
+                    for i in range(10*scale)],
+        'v110': [encode_110(generate_pages(rng, 40,
+                                           height=FieldConstants110.HEIGHT,
+                                           garbage=False))
+                 for i in range(20*scale)],
+    }
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+"""Run the benchmarks, and save or compare the results with a baseline.
+
+Usage:
+    python benchmarks/run.py [--filter NAME] [--save PATH] [--compare PATH]
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from corpus import _random_operation, generate_corpus
+
+from py_fumen_py.action import Action, ActionCodec
+from py_fumen_py.comment import CommentCodec
+from py_fumen_py.constant import FieldConstants
+from py_fumen_py.field import Field
+from py_fumen_py.fumen_codec import _get_reader, decode, encode
+from py_fumen_py.js_escape import escape, unescape
+from py_fumen_py.operation import Operation
+from py_fumen_py.replay import replay
+
+_BENCHMARKS = {}
+# The version of the baseline file format, baselines of other versions are
+# not compared with
+_FORMAT = 2
+# Peak memory growth below this many bytes is never a regression, as small
+# peaks vary between runs
+_MEMORY_SLACK = 64 * 1024
+
+def benchmark(name, unit):
+    """Register a benchmark function.
+    The function is called with the corpus, and returns a function doing the
+    measured work once and returning the number of units processed.
+    """
+    def register(function):
+        _BENCHMARKS[name] = (function, unit)
+        return function
+    return register
+
+def _make_codec_benchmarks(group):
+    @benchmark(f'decode/{group}', 'pages/s')
+    def decode_benchmark(corpus):
+        strings = corpus[group]
+        return lambda: sum(len(decode(string)) for string in strings)
+
+    @benchmark(f'encode/{group}', 'pages/s')
+    def encode_benchmark(corpus):
+        pages_list = [decode(string) for string in corpus[group]]
+        def run():
+            for pages in pages_list:
+                encode(pages)
+            return sum(map(len, pages_list))
+        return run
+
+for _group in ['short', 'long', 'comments', 'quiz', 'repeats']:
+    _make_codec_benchmarks(_group)
+
+@benchmark('decode/v110', 'pages/s')
+def decode_110(corpus):
+    strings = corpus['v110']
+    return lambda: sum(len(decode(string)) for string in strings)
+
+@benchmark('decode/retained', 'pages/s')
+def decode_retained(corpus):
+    # Keep all decoded pages, so that the peak memory is mostly theirs
+    strings = corpus['long'] + corpus['short'] + corpus['repeats']
+    def run():
+        pages_list = [decode(string) for string in strings]
+        return sum(map(len, pages_list))
+    return run
+
+def _placements(corpus):
+    # Return (field, operation) of the pages with an operation
+    return [(page.field, page.operation)
+            for string in corpus['long'] for page in decode(string)
+            if page.operation is not None]
+
+@benchmark('field/lock', 'ops/s')
+def field_lock(corpus):
+    placements = _placements(corpus)
+    def run():
+        for field, operation in placements:
+            field.copy().lock(operation)
+        return len(placements)
+    return run
+
+@benchmark('field/drop', 'ops/s')
+def field_drop(corpus):
+    placements = [
+        (field, Operation(operation.mino, operation.rotation, operation.x,
+                          FieldConstants.HEIGHT-3))
+        for field, operation in _placements(corpus)
+    ]
+    placements = [(field, operation) for field, operation in placements
+                  if field.is_placeable(operation)]
+    def run():
+        for field, operation in placements:
+            field.drop(operation, place=False)
+        return len(placements)
+    return run
+
+@benchmark('field/clear_line', 'ops/s')
+def field_clear_line(corpus):
+    fields = []
+    for field, operation in _placements(corpus):
+        field = field.copy()
+        field.lock(operation)
+        fields.append(field)
+    def run():
+        for field in fields:
+            field.copy().clear_line()
+        return len(fields)
+    return run
+
+def _game_logs(seed, action_count):
+    # Return lists of locked actions, each played from an empty field until
+    # no more operation can be placed
+    rng = random.Random(seed)
+    logs = []
+    while sum(map(len, logs)) < action_count:
+        field = Field()
+        actions = []
+        while (operation := _random_operation(
+                rng, field, FieldConstants.HEIGHT)) is not None:
+            actions.append(Action(operation, False, False, True, False, True))
+            field.apply_action(actions[-1])
+        logs.append(actions)
+    return logs
+
+@benchmark('replay/apply_action', 'actions/s')
+def replay_apply_action(corpus):
+    logs = _game_logs(0, 2000)
+    def run():
+        for actions in logs:
+            field = Field()
+            for action in actions:
+                field.apply_action(action)
+        return sum(map(len, logs))
+    return run
+
+@benchmark('replay/bulk', 'actions/s')
+def replay_bulk(corpus):
+    logs = _game_logs(0, 2000)
+    def run():
+        for actions in logs:
+            replay(Field(), actions)
+        return sum(map(len, logs))
+    return run
+
+@benchmark('action_codec', 'ops/s')
+def action_codec(corpus):
+    encoded_actions = []
+    for string in corpus['long'] + corpus['short']:
+        fumen_reader = _get_reader(string)
+        while fumen_reader:
+            fumen_reader.read_field_diffs()
+            encoded_actions.append(fumen_reader.poll(3))
+            action = ActionCodec.decode(FieldConstants, encoded_actions[-1])
+            if action.comment:
+                fumen_reader.read_comment()
+    def run():
+        for encoded_action in encoded_actions:
+            ActionCodec.encode(FieldConstants, ActionCodec.decode(
+                FieldConstants, encoded_action))
+        return len(encoded_actions)
+    return run
+
+def _comments(corpus):
+    return [page.comment for string in corpus['comments'] + corpus['quiz']
+            for page in decode(string)]
+
+@benchmark('comment_codec', 'chars/s')
+def comment_codec(corpus):
+    comments = [escape(comment)[:4095] for comment in _comments(corpus)]
+    def run():
+        for comment in comments:
+            length, values = CommentCodec.encode(comment)
+            CommentCodec.decode(values)[:length]
+        return sum(map(len, comments))
+    return run
+
+@benchmark('js_escape', 'chars/s')
+def js_escape(corpus):
+    comments = _comments(corpus)
+    def run():
+        for comment in comments:
+            unescape(escape(comment))
+        return sum(map(len, comments))
+    return run
+
+def _reference():
+    # A fixed pure Python workload mixing integer, list, dict and str
+    # operations like the codec does, which the benchmark throughputs are
+    # divided by, so that the scores do not depend on the speed of the
+    # machine or its load at the time
+    table = {}
+    values = []
+    for i in range(2000):
+        key = str(i % 97)
+        table[key] = table.get(key, 0) + (i * 31 & 0xFF)
+        values.append(table[key] >> 2)
+    values.sort()
+    return len(values)
+
+def _sample(run, min_time):
+    # Return the throughput of run, called as many times as needed to take
+    # at least min_time seconds
+    count = 0
+    start = time.perf_counter()
+    while True:
+        count += run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return count / elapsed
+
+def run_benchmarks(corpus, names, repeat, min_time):
+    """Run the named benchmarks, return a dict of their results.
+    Each of the repeat samples runs a benchmark for at least min_time
+    seconds, right after a sample of the reference workload. The score is
+    the median of the ratios of the two throughputs, which is what is
+    compared with a baseline, and the throughput is the median of the
+    samples. The peak memory is traced in one more run.
+    """
+    results = {}
+    for name in names:
+        function, unit = _BENCHMARKS[name]
+        run = function(corpus)
+        run()
+        throughputs = []
+        scores = []
+        for i in range(repeat):
+            reference = _sample(_reference, min_time)
+            throughputs.append(_sample(run, min_time))
+            scores.append(throughputs[-1] / reference)
+
+        tracemalloc.start()
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        throughput = statistics.median(throughputs)
+        score = statistics.median(scores)
+        results[name] = {'score': score, 'throughput': throughput,
+                         'unit': unit, 'peak_memory': peak_memory}
+        print(f'{name:<20} {throughput:>14,.0f} {unit:<10} {score:>10.4f} '
+              f'{peak_memory/1024:>10,.0f} KiB peak', flush=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Return the list of regressions of results against the baseline.
+    A benchmark regresses if its score drops, or its peak memory grows, by
+    more than the tolerance ratio.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['score'] < base['score'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: score {result["score"]:.4f} < {base["score"]:.4f}')
+        if result['peak_memory'] > max(base['peak_memory'] * (1 + tolerance),
+                                       base['peak_memory'] + _MEMORY_SLACK):
+            regressions.append(
+                f'{name}: peak memory {result["peak_memory"]:,} > '
+                f'{base["peak_memory"]:,} bytes')
+    return regressions
+
+def _load_baseline(path, seed, scale):
+    # Return the results of the baseline file, raising ValueError if they
+    # were not measured in the same format and on the same corpus
+    with open(path) as file:
+        baseline = json.load(file)
+    if baseline.get('format') != _FORMAT:
+        raise ValueError(f'{path} has format {baseline.get("format")}, '
+                         f'expected {_FORMAT}')
+    if (baseline['seed'], baseline['scale']) != (seed, scale):
+        raise ValueError(f'{path} was measured with --seed '
+                         f'{baseline["seed"]} --scale {baseline["scale"]}, '
+                         f'not --seed {seed} --scale {scale}')
+    return baseline['results']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', default='',
+                        help='only run the benchmarks containing FILTER')
+    parser.add_argument('--repeat', type=int, default=7,
+                        help='samples of each benchmark (default: 7)')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum seconds of each sample (default: 0.2)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic corpus (default: 0)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='size multiplier of the corpus (default: 1)')
+    parser.add_argument('--save', metavar='PATH',
+                        help='save the results to a baseline JSON file, '
+                             'replacing only the entries of the benchmarks '
+                             'run if it exists with the same corpus')
+    parser.add_argument('--compare', metavar='PATH',
+                        help='fail if the results regress from a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed regression ratio (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    # Check the baseline first, not to run the benchmarks for nothing
+    baseline = None
+    if args.compare:
+        try:
+            baseline = _load_baseline(args.compare, args.seed, args.scale)
+        except ValueError as error:
+            print(f'Cannot compare: {error}', file=sys.stderr)
+            return 2
+
+    names = [name for name in _BENCHMARKS if args.filter in name]
+    corpus = generate_corpus(args.seed, args.scale)
+    print(f'{"benchmark":<20} {"throughput":>14} {"unit":<10} {"score":>10} '
+          f'{"memory":>14}', flush=True)
+    results = run_benchmarks(corpus, names, args.repeat, args.min_time)
+
+    if args.save:
+        saved = {}
+        try:
+            saved = _load_baseline(args.save, args.seed, args.scale)
+        except (OSError, ValueError):
+            pass
+        saved.update(results)
+        with open(args.save, 'w') as file:
+            json.dump({'format': _FORMAT,
+                       'python': platform.python_version(),
+                       'seed': args.seed, 'scale': args.scale,
+                       'results': {name: saved[name] for name in _BENCHMARKS
+                                   if name in saved}}, file, indent=2)
+            file.write('\n')
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
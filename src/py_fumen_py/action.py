@@ -5,7 +5,7 @@ from dataclasses import dataclass
 from .constant import FieldConstants as Consts
 from .operation import Mino, Rotation, Operation
 
-@dataclass
+@dataclass(slots=True)
 class Action():
     """A dataclass for storing encoded Fumen page flags and field changes.
     Keyword arguments:
@@ -71,24 +71,38 @@ class ActionCodec() :
         return (dx + encoded_coords % consts.WIDTH,
                 dy + consts.HEIGHT - encoded_coords // consts.WIDTH - 1)
 
+    _TABLES = {}
+
+    @classmethod
+    def _tables(cls, consts):
+        # Return the decoding and encoding tables of consts, built once.
+        # The operation table is indexed by the lower part of an encoded
+        # action (mino, rotation and coordinates), and the flag table by the
+        # upper part. The encoding table maps the operations of the colored
+        # minos back to the index in the operation table.
+        tables = cls._TABLES.get(consts)
+        if tables is None:
+            operations = []
+            encoding = {}
+            for encoded_coords in range(consts.TOTAL_BLOCK_COUNT):
+                for rotation in map(Rotation, range(4)):
+                    for mino in map(Mino, range(8)):
+                        x, y = cls._decode_coords(consts, encoded_coords,
+                                                  mino, rotation)
+                        if mino.is_colored():
+                            encoding[mino, rotation, x, y] = len(operations)
+                        operations.append((mino, rotation, x, y))
+            flags = [(bool(r & 1), bool(r & 2), bool(r & 4), bool(r & 8),
+                      not r & 16) for r in range(32)]
+            tables = cls._TABLES[consts] = (operations, flags, encoding)
+        return tables
+
     @classmethod
     def decode(cls, consts, encoded_action):
-        q, r = divmod(encoded_action, 8)
-        mino = Mino(r)
-        q, r = divmod(q, 4)
-        rotation = Rotation(r)
-        q, r = divmod(q, consts.TOTAL_BLOCK_COUNT)
-        x, y = cls._decode_coords(consts, r, mino, rotation)
-        q, r = divmod(q, 2)
-        rise = bool(r)
-        q, r = divmod(q, 2)
-        mirror = bool(r)
-        q, r = divmod(q, 2)
-        colorize = bool(r)
-        q, r = divmod(q, 2)
-        comment = bool(r)
-        q, r = divmod(q, 2)
-        lock = not bool(r)
+        operations, flags, _ = cls._tables(consts)
+        q, r = divmod(encoded_action, len(operations))
+        mino, rotation, x, y = operations[r]
+        rise, mirror, colorize, comment, lock = flags[q % 32]
 
         return Action(operation=Operation(mino=mino, rotation=rotation,
                                           x=x, y=y),
@@ -113,6 +127,17 @@ class ActionCodec() :
 
     @classmethod
     def encode(cls, consts, action):
+        operations, _, encoding = cls._tables(consts)
+        operation = action.operation
+        encoded_operation = encoding.get((operation.mino, operation.rotation,
+                                          operation.x, operation.y))
+        if encoded_operation is None:
+            encoded_operation = cls._encode_coords(consts, operation)
+            encoded_operation *= 4
+            encoded_operation += cls._encode_rotation(operation)
+            encoded_operation *= 8
+            encoded_operation += operation.mino
+
         encoded_action = int(not action.lock)
         encoded_action *= 2
         encoded_action += bool(action.comment)
@@ -122,11 +147,7 @@ class ActionCodec() :
         encoded_action += bool(action.mirror)
         encoded_action *= 2
         encoded_action += bool(action.rise)
-        encoded_action *= consts.TOTAL_BLOCK_COUNT
-        encoded_action += cls._encode_coords(consts, action.operation)
-        encoded_action *= 4
-        encoded_action += cls._encode_rotation(action.operation)
-        encoded_action *= 8
-        encoded_action += action.operation.mino
+        encoded_action *= len(operations)
+        encoded_action += encoded_operation
 
         return encoded_action
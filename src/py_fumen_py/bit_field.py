@@ -0,0 +1,410 @@
+# -*- coding: utf-8 -*-
+
+from itertools import chain
+
+from .constant import FieldConstants as Consts
+from .field import Field
+from .operation import Mino
+
+class BitField:
+    """Keep data of a Tetris playing field as bitboards.
+    The field is stored as one occupancy bitboard and four colour planes
+    (one for each bit of the Mino value), all being plain ints.
+    The grid (x, y) is kept at bit (y+GARBAGE_HEIGHT)*WIDTH+x of every board,
+    so the garbage line(s) take the lowest bits.
+    The API is the same as Field, except that lines returned by indexing are
+    copies instead of the stored data.
+    """
+    _PLANE_COUNT = 4
+    _ROW_MASK = (1 << Consts.WIDTH) - 1
+    _GARBAGE_MASK = (1 << Consts.GARBAGE_HEIGHT*Consts.WIDTH) - 1
+    _BOARD_MASK = (1 << Consts.TOTAL_BLOCK_COUNT) - 1
+    _FIELD_MASK = _BOARD_MASK ^ _GARBAGE_MASK
+    _BOTTOM_MASK = _ROW_MASK << Consts.GARBAGE_HEIGHT*Consts.WIDTH
+    _REVERSED_ROWS = [int(f'{row:0{Consts.WIDTH}b}'[::-1], 2)
+                      for row in range(1 << Consts.WIDTH)]
+    # Tables translating one mino value per byte into b'1' or b'0', for the
+    # occupancy and for each bit of the value
+    _OCCUPIED_DIGITS = bytes.maketrans(bytes(range(16)),
+                                       b'0' + b'1'*15)
+    _PLANE_DIGITS = [bytes.maketrans(bytes(range(16)), bytes(
+        ord('1') if (value >> i) & 1 else ord('0') for value in range(16)
+    )) for i in range(_PLANE_COUNT)]
+    # The board of b'0' digits, one byte per grid
+    _ZERO_DIGITS = int.from_bytes(b'0' * Consts.TOTAL_BLOCK_COUNT, 'big')
+    _MINOS = tuple(Mino)
+
+    @staticmethod
+    def _bit(x, y):
+        # Return the bit index of grid (x, y)
+        return (y+Consts.GARBAGE_HEIGHT) * Consts.WIDTH + x
+
+    @classmethod
+    def _repeated_row(cls, row_mask):
+        # Return the board with row_mask repeated in every line
+        return sum(row_mask << y*Consts.WIDTH
+                   for y in range(Consts.TOTAL_HEIGHT))
+
+    @classmethod
+    def _operation_mask(cls, operation):
+        # Return the board occupied by the operation
+        mask = operation.mask()
+        if mask is None:
+            mask = sum(1 << cls._bit(x, y) for x, y in operation._cells())
+        return mask
+
+    def __init__(self, field=None, garbage=None):
+        """Create a BitField object by parsing the given args.
+        Keyword arguments:
+        field: the playable part of the field (default=None)
+        garbage: the garbage part of the field (default=None)
+        """
+        self._occupied = 0
+        self._planes = [0] * self._PLANE_COUNT
+        lines = (Field._field_init(Consts.GARBAGE_HEIGHT, garbage)[::-1]
+                 + Field._field_init(Consts.HEIGHT, field))
+        for y, line in enumerate(lines, -Consts.GARBAGE_HEIGHT):
+            self._set_line(y, line)
+
+    @classmethod
+    def from_field(cls, field):
+        """Create a BitField object with the content of a Field object."""
+        # The mino values in bit order are translated into binary digits,
+        # highest bit first, for each board
+        values = bytes(chain.from_iterable(
+            field._line(y) for y in Field._to_field_range()
+        ))[::-1]
+        bit_field = cls.__new__(cls)
+        bit_field._occupied = int(values.translate(cls._OCCUPIED_DIGITS), 2)
+        bit_field._planes = [int(values.translate(digits), 2)
+                             for digits in cls._PLANE_DIGITS]
+        return bit_field
+
+    def to_field(self):
+        """Return a Field object with the content of the BitField."""
+        # Each plane is spread into one byte per grid through its binary
+        # digits, then the planes are added up into the mino values
+        values = 0
+        for i, plane in enumerate(self._planes):
+            digits = f'{plane:0{Consts.TOTAL_BLOCK_COUNT}b}'.encode('ascii')
+            values += (int.from_bytes(digits, 'big') - self._ZERO_DIGITS) << i
+        values = values.to_bytes(Consts.TOTAL_BLOCK_COUNT, 'little')
+        lines = [list(map(self._MINOS.__getitem__, values[i:i+Consts.WIDTH]))
+                 for i in range(0, Consts.TOTAL_BLOCK_COUNT, Consts.WIDTH)]
+        return Field._from_lines(lines[Consts.GARBAGE_HEIGHT:],
+                                 lines[Consts.GARBAGE_HEIGHT-1::-1])
+
+    def _line(self, y):
+        # Return the line y as a new list of Mino
+        shift = (y+Consts.GARBAGE_HEIGHT) * Consts.WIDTH
+        rows = [(plane >> shift) & self._ROW_MASK for plane in self._planes]
+        return [Mino(sum(((row >> x) & 1) << i for i, row in enumerate(rows)))
+                for x in range(Consts.WIDTH)]
+
+    def _set_line(self, y, line):
+        # Replace the line y with the given Mino list
+        shift = (y+Consts.GARBAGE_HEIGHT) * Consts.WIDTH
+        keep = ~(self._ROW_MASK << shift)
+        for i in range(self._PLANE_COUNT):
+            row = sum(((mino >> i) & 1) << x for x, mino in enumerate(line))
+            self._planes[i] = (self._planes[i] & keep) | (row << shift)
+        self._refresh_occupied()
+
+    def _refresh_occupied(self):
+        # Recompute the occupancy board from the colour planes
+        occupied = 0
+        for plane in self._planes:
+            occupied |= plane
+        self._occupied = occupied
+
+    def _map_boards(self, function):
+        # Apply the same board transformation on every stored board
+        self._planes = [function(plane) for plane in self._planes]
+        self._occupied = function(self._occupied)
+
+    def __getitem__(self, key):
+        """Return a copy of the specified line(s) in the field
+        The key can be an int (for one line) or a slice (for a set of lines)
+        Negative values in slices are deemed as indexing of garbage lines,
+        instead of counting from the end of the field.
+        """
+        if isinstance(key, slice):
+            return [self[y] for y in Field._to_field_range(key)]
+        elif isinstance(key, int):
+            if -Consts.GARBAGE_HEIGHT <= key < Consts.HEIGHT:
+                return self._line(key)
+            raise IndexError(f'Line index out of range: {key}')
+        else:
+            raise TypeError(f'Unsupported indexing: {key}')
+
+    def __setitem__(self, key, value):
+        """Modify specified line(s) in the field
+        The key can be an int (for one line) or a slice (for a set of lines)
+        Negative values in slices are deemed as indexing of garbage lines,
+        instead of counting from the end of the field.
+        """
+        if isinstance(key, slice):
+            for y, line in zip(Field._to_field_range(key), value, strict=True):
+                self._set_line(y, line)
+        elif isinstance(key, int):
+            if -Consts.GARBAGE_HEIGHT <= key < Consts.HEIGHT:
+                self._set_line(key, value)
+            else:
+                raise IndexError(f'Line index out of range: {key}')
+        else:
+            raise TypeError(f'Unsupported indexing: {key}')
+
+    def copy(self):
+        """Return a copy of the field."""
+        bit_field = BitField.__new__(BitField)
+        bit_field._occupied = self._occupied
+        bit_field._planes = self._planes[:]
+        return bit_field
+
+    def at(self, x, y):
+        """Return the mino at grid (x, y)."""
+        bit = self._bit(x, y)
+        return Mino(sum(((plane >> bit) & 1) << i
+                        for i, plane in enumerate(self._planes)))
+
+    def fill(self, x, y, mino):
+        """Modify the mino at grid (x, y) to mino."""
+        self._fill_mask(1 << self._bit(x, y), mino)
+
+    def _fill_mask(self, mask, mino):
+        # Modify every grid in the mask to mino
+        for i in range(self._PLANE_COUNT):
+            if (mino >> i) & 1:
+                self._planes[i] |= mask
+            else:
+                self._planes[i] &= ~mask
+        if mino:
+            self._occupied |= mask
+        else:
+            self._refresh_occupied()
+
+    def is_placeable_at(self, x, y):
+        """Test if the desired grid is inside and empty."""
+        return (0 <= x < Consts.WIDTH and 0 <= y < Consts.HEIGHT
+                and not (self._occupied >> self._bit(x, y)) & 1)
+
+    def is_placeable(self, operation):
+        """Test if the operation locates within empty region."""
+        if operation is None:
+            return True
+        mask = operation.mask()
+        return mask is not None and not mask & self._occupied
+
+    def is_grounded(self, operation):
+        """Test if the operation touches the ground if placed."""
+        if operation is None:
+            return True
+        if not self.is_placeable(operation):
+            return False
+        mask = self._operation_mask(operation)
+        return bool(mask & self._BOTTOM_MASK
+                    or (mask >> Consts.WIDTH) & self._occupied)
+
+    def lock(self, operation, forced=False):
+        """Lock an operation in place and modify the field.
+        Keyword arguments:
+        operation
+        forced: if the operation should still be placed if it is not located
+            in an empty regoin. (default: False)
+        """
+        if operation is not None:
+            if not (forced or self.is_placeable(operation)):
+                raise ValueError(f'operation cannot be locked: {operation}')
+            self._fill_mask(self._operation_mask(operation), operation.mino)
+
+    def drop(self, operation, place=True):
+        """Drop an operation to the ground and possibly modify the field.
+        Return the dropped (shifted-down) operation
+        Keyword arguments:
+        operation
+        place: if the operation should be locked on the field. (deafult: True)
+        """
+        if operation is None:
+            return None
+
+        if self.is_placeable(operation):
+            mask = self._operation_mask(operation)
+            dy = 0
+            while not (mask & self._BOTTOM_MASK
+                       or (mask >> Consts.WIDTH) & self._occupied):
+                mask >>= Consts.WIDTH
+                dy += 1
+            prev_operation = operation.shifted(0, -dy)
+        else:
+            prev_operation = operation.shifted(0, 0)
+            for dy in range(-1, -Consts.HEIGHT-1, -1):
+                shifted_operation = operation.shifted(0, dy)
+                if not self.is_placeable(shifted_operation):
+                    break
+                prev_operation = shifted_operation
+            else:
+                raise ValueError(f'operation cannot be dropped: {operation}')
+
+        if place:
+            self.lock(prev_operation)
+        return prev_operation
+
+    def rise(self):
+        """Rise the garbage line(s) into the playing field and clear the
+        garbage line(s).
+        """
+        self._map_boards(lambda board: (board << Consts.GARBAGE_HEIGHT
+                                        * Consts.WIDTH) & self._BOARD_MASK)
+
+    def mirror(self, mirror_color=False):
+        """Mirror the field.
+        Keyword arguments:
+        mirror_color: if the L-J and Z-S color swap should happen. (default:
+            False)
+        """
+        def mirrored(board):
+            result = board & self._GARBAGE_MASK
+            for y in range(Consts.HEIGHT):
+                shift = (y+Consts.GARBAGE_HEIGHT) * Consts.WIDTH
+                result |= self._REVERSED_ROWS[
+                    (board >> shift) & self._ROW_MASK
+                ] << shift
+            return result
+        self._map_boards(mirrored)
+
+        if mirror_color:
+            p0, p1, p2, p3 = self._planes
+            # L (0010) <-> J (0110) and Z (0100) <-> S (0111)
+            lj = ~p3 & ~p0 & p1 & self._FIELD_MASK
+            zs = ~p3 & p2 & ~(p0 ^ p1) & self._FIELD_MASK
+            self._planes = [p0 ^ zs, p1 ^ zs, p2 ^ lj, p3]
+
+    def shift_up(self, amount=1):
+        """Shift the playing field upwards.
+        Keyword arguments:
+        amount: (default: 1)
+        """
+        self._map_boards(lambda board: (
+            ((board & self._FIELD_MASK) << amount*Consts.WIDTH
+             & self._FIELD_MASK) | (board & self._GARBAGE_MASK)
+        ))
+
+    def shift_down(self, amount=1):
+        """Shift the playing field downwards.
+        Keyword arguments:
+        amount: (default: 1)
+        """
+        self._map_boards(lambda board: (
+            ((board & self._FIELD_MASK) >> amount*Consts.WIDTH
+             & self._FIELD_MASK) | (board & self._GARBAGE_MASK)
+        ))
+
+    def shift_left(self, amount=1, warp=False):
+        """Shift or warp the playing field to the left.
+        Keyword arguments:
+        amount: (default: 1)
+        warp: if the left-most columns should be warpped to the right.
+            (default: False)
+        """
+        kept = self._repeated_row(self._ROW_MASK >> amount)
+        warped = self._repeated_row(self._ROW_MASK >> Consts.WIDTH-amount)
+        self._map_boards(lambda board: (
+            ((board >> amount) & kept)
+            | (((board & warped) << Consts.WIDTH-amount) if warp else 0)
+        ))
+
+    def shift_right(self, amount=1, warp=False):
+        """Shift or warp the playing field to the right.
+        Keyword arguments:
+        amount: (default: 1)
+        warp: if the right-most columns should be warpped to the left.
+            (default: False)
+        """
+        kept = self._repeated_row(self._ROW_MASK >> amount)
+        warped = self._repeated_row(self._ROW_MASK >> Consts.WIDTH-amount)
+        self._map_boards(lambda board: (
+            ((board & kept) << amount)
+            | (((board >> Consts.WIDTH-amount) & warped) if warp else 0)
+        ))
+
+    def is_lineclear_at(self, y):
+        """Test if a line is filled."""
+        return ((self._occupied >> self._bit(0, y)) & self._ROW_MASK
+                == self._ROW_MASK)
+
+    def clear_line(self):
+        """Clear filled lines on the field."""
+        kept_shifts = []
+        for y in range(Consts.HEIGHT):
+            shift = (y+Consts.GARBAGE_HEIGHT) * Consts.WIDTH
+            if (self._occupied >> shift) & self._ROW_MASK != self._ROW_MASK:
+                kept_shifts.append(shift)
+        n_lineclear = Consts.HEIGHT - len(kept_shifts)
+
+        if n_lineclear:
+            def cleared(board):
+                result = board & self._GARBAGE_MASK
+                for y, shift in enumerate(kept_shifts, Consts.GARBAGE_HEIGHT):
+                    result |= ((board >> shift) & self._ROW_MASK
+                               ) << y*Consts.WIDTH
+                return result
+            self._map_boards(cleared)
+        return n_lineclear
+
+    def apply_action(self, action):
+        """Apply the suitable flags in an Action class on the field."""
+        if action.lock:
+            if action.operation.mino.is_colored():
+                self.lock(action.operation)
+            self.clear_line()
+            if action.rise:
+                self.rise()
+            if action.mirror:
+                self.mirror()
+
+    def column_heights(self):
+        """Return the height of the highest block in each column."""
+        heights = [0] * Consts.WIDTH
+        occupied = self._occupied >> Consts.GARBAGE_HEIGHT*Consts.WIDTH
+        y = 0
+        while occupied:
+            row = occupied & self._ROW_MASK
+            for x in range(Consts.WIDTH):
+                if (row >> x) & 1:
+                    heights[x] = y + 1
+            occupied >>= Consts.WIDTH
+            y += 1
+        return heights
+
+    def height(self):
+        """Return the y coordinate of the highest non-empty mino."""
+        return max(0, -(-(self._occupied & self._FIELD_MASK).bit_length()
+                        // Consts.WIDTH) - Consts.GARBAGE_HEIGHT)
+
+    def _string(self, start=None, stop=None, truncated=True, separator='\n'):
+        # Return the string representation of a segment of the field.
+        start = -Consts.GARBAGE_HEIGHT if start is None else start
+        stop = Consts.HEIGHT if stop is None else stop
+        if truncated:
+            stop = min(stop, self.height())
+        return separator.join(
+            reversed([''.join(mino.name for mino in line)
+                      for line in self[start:stop]])
+        )
+
+    def string(self, truncated=True, separator='\n', with_garbage=True):
+        """Return the string representation of the field.
+        Keyword arguments:
+        truncated: if the blank upper field should be omitted. (default: True)
+        separator: the separator between each field line. (default: '\n')
+        with_garbage: if the garbage line(s) should be included in the result.
+            (default: True)
+        """
+        return self._string(None if with_garbage else 0, None,
+                            truncated, separator)
+
+    def __repr__(self):
+        return f'<BitField:{self.string(truncated=False, separator=",")}>'
+
+    def __str__(self):
+        return self.string()
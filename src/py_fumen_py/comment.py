@@ -2,34 +2,53 @@
 
 class CommentCodec:
     """Codec of comment string segment, from/to fumen data (int).
+    Each value holds 4 characters, which are converted 2 at a time through
+    the tables of all character pairs.
     """
     _ENCODING_TABLE = (' !"#$%&\'()*+,-./0123456789:;<=>?@'
                       'ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`'
                       'abcdefghijklmnopqrstuvwxyz{|}~')
     _DECODING_TABLE = {char: i for i, char in enumerate(_ENCODING_TABLE)}
     _TABLE_LENGTH = len(_ENCODING_TABLE) + 1
+    _PAIR_LENGTH = _TABLE_LENGTH * _TABLE_LENGTH
+    _PAIR_TABLES = None
 
     @classmethod
-    def decode(cls, encoded_comments):
-        string = ''
-
-        for value in encoded_comments:
-            for i in range(4):
-                value, ch = divmod(value, cls._TABLE_LENGTH)
-                string += cls._ENCODING_TABLE[ch]
+    def _pair_tables(cls):
+        # Return the decoding and encoding tables of character pairs, built
+        # once. The decoding table maps i+j*_TABLE_LENGTH to the characters i
+        # and j, or None if either is out of the encoding table. The encoding
+        # table maps the pairs back.
+        if cls._PAIR_TABLES is None:
+            decoding = [None] * cls._PAIR_LENGTH
+            encoding = {}
+            for i, first in enumerate(cls._ENCODING_TABLE):
+                for j, second in enumerate(cls._ENCODING_TABLE):
+                    value = i + j * cls._TABLE_LENGTH
+                    decoding[value] = first + second
+                    encoding[first + second] = value
+            cls._PAIR_TABLES = (decoding, encoding)
+        return cls._PAIR_TABLES
 
-        return string
+    @classmethod
+    def decode(cls, encoded_comments):
+        pairs, _ = cls._pair_tables()
+        pair_length = cls._PAIR_LENGTH
+        try:
+            return ''.join([pairs[value % pair_length]
+                            + pairs[value // pair_length % pair_length]
+                            for value in encoded_comments])
+        except TypeError:
+            raise IndexError('Unsupported comment character value') from None
 
     @classmethod
     def encode(cls, comment):
-        result = []
+        _, pairs = cls._pair_tables()
+        pair_length = cls._PAIR_LENGTH
         length = len(comment)
+        # Missing characters in the last value are the same as ' ' (0)
+        comment += ' ' * (-length % 4)
 
-        for i in range(0, length, 4):
-            value = 0
-            for char in reversed(comment[i:i+4]):
-                value = cls._DECODING_TABLE[char] + value * cls._TABLE_LENGTH
-            result.append(value)
-
-        return length, result
-
+        return length, [pairs[comment[i:i+2]]
+                        + pairs[comment[i+2:i+4]] * pair_length
+                        for i in range(0, length, 4)]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import re
+import struct
+from collections.abc import Sequence
+
+from .constant import FieldConstants110
+from .fumen_codec import _get_reader, decode, decode_lazy
+
+# The index file is a header followed by one entry per fumen string found in
+# the corpus: its byte offset and length, its version and its page count.
+# The size and modification time of the corpus are kept in the header to
+# detect a stale index.
+_MAGIC = b'FUMENIX1'
+_HEADER = struct.Struct('<8sQQQ')
+_ENTRY = struct.Struct('<QIHI')
+
+_FUMEN_PATTERN = re.compile(rb'[vmd]11[05]@[A-Za-z0-9+/?]*')
+
+def _count_pages(fumen_reader):
+    # Return the number of pages in the reader, without touching any field
+    # or decoding any comment
+    page_count = 0
+    while fumen_reader:
+        fumen_reader.read_field_diffs()
+        if fumen_reader.read_action().comment:
+            fumen_reader.poll_values(5, (fumen_reader.poll(2)+3)//4)
+        page_count += 1
+    return page_count
+
+class FumenCorpus(Sequence):
+    """A read-only sequence of the fumen strings found in a text file.
+    The file is scanned once to build an offset index, which is saved next to
+    it and reused as long as the file is unchanged. Indexing decodes only
+    the requested string from the memory-mapped file.
+    """
+    def __init__(self, path, index_path=None, rebuild=False):
+        """Open the corpus at path, building its index if needed.
+        Keyword arguments:
+        path: the text file containing fumen strings, separated by any
+            character that cannot be in a fumen string, such as newlines.
+        index_path: the index file, None for path with '.idx' appended.
+            (default: None)
+        rebuild: if the index should be rebuilt even if it is up to date.
+            (default: False)
+        """
+        self._path = path
+        self._index_path = path + '.idx' if index_path is None else index_path
+        with open(path, 'rb') as file:
+            stat = os.fstat(file.fileno())
+            self._mmap = (mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                          if stat.st_size else b'')
+        self._stamp = (stat.st_size, stat.st_mtime_ns)
+        if rebuild or not self._load_index():
+            self._build_index()
+            self._save_index()
+
+    def _load_index(self):
+        # Load the index file, return whether it exists and is up to date
+        try:
+            with open(self._index_path, 'rb') as file:
+                index = file.read()
+        except FileNotFoundError:
+            return False
+        if len(index) < _HEADER.size:
+            return False
+        magic, count, size, mtime = _HEADER.unpack_from(index)
+        if (magic != _MAGIC or (size, mtime) != self._stamp
+                or len(index) != _HEADER.size + count*_ENTRY.size):
+            return False
+        self._entries = list(_ENTRY.iter_unpack(index[_HEADER.size:]))
+        return True
+
+    def _build_index(self):
+        # Scan the corpus for fumen strings, skipping the undecodable ones
+        self._entries = []
+        for match in _FUMEN_PATTERN.finditer(self._mmap):
+            try:
+                fumen_reader = _get_reader(match[0].decode('ascii'))
+                page_count = _count_pages(fumen_reader)
+            except (ValueError, IndexError):
+                continue
+            version = 110 if fumen_reader._consts is FieldConstants110 else 115
+            self._entries.append((match.start(), match.end() - match.start(),
+                                  version, page_count))
+
+    def _save_index(self):
+        # Write the index file next to the corpus
+        with open(self._index_path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, len(self._entries), *self._stamp))
+            for entry in self._entries:
+                file.write(_ENTRY.pack(*entry))
+
+    def string(self, index):
+        """Return the fumen string at index."""
+        offset, length, _, _ = self._entries[index]
+        return self._mmap[offset:offset+length].decode('ascii')
+
+    def version(self, index):
+        """Return the version (115 or 110) of the fumen string at index."""
+        return self._entries[index][2]
+
+    def page_count(self, index):
+        """Return the number of pages of the fumen string at index."""
+        return self._entries[index][3]
+
+    def decode_lazy(self, index, keyframe_interval=16):
+        """Decode the fumen string at index into a LazyPages sequence."""
+        return decode_lazy(self.string(index), keyframe_interval)
+
+    def __getitem__(self, key):
+        """Return the decoded pages of the fumen string(s) at key."""
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        return decode(self.string(key))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        """Unmap the corpus file."""
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+from copy import copy
+from dataclasses import dataclass, replace
+from typing import Any, Tuple
+
+from .field import Field
+from .fumen_buffer import FumenBufferReader
+from .fumen_codec import _DecodeState, _decode_pages, _normalize
+from .page import Page, _raw_comment
+
+# The estimated memory taken by a decoded page and its field, in bytes
+_PAGE_BYTES = 3000
+# The length of the data head used to look up cached prefixes, shorter
+# cached data is not resumed from
+_HEAD_LENGTH = 32
+
+@dataclass
+class CacheInfo():
+    """A dataclass for storing the statistics of a DecodeCache.
+    Keyword arguments:
+    hits: the number of strings found in the cache.
+    misses: the number of strings decoded, including the resumed ones.
+    resumed: the number of misses decoded from a cached prefix.
+    size: the number of cached strings.
+    bytes: the estimated memory taken by the cached pages.
+    """
+    hits: int = 0
+    misses: int = 0
+    resumed: int = 0
+    size: int = 0
+    bytes: int = 0
+
+@dataclass
+class _CacheEntry:
+    # The decoded pages of one string, and the state after its last page
+    consts: Any
+    data: str
+    pages: Tuple[Page, ...]
+    field: Any
+    state: _DecodeState
+    field_repeat_count: int
+    size: int
+
+def _copy_page(page):
+    # Return a copy of the cached page that can be modified freely
+    return Page(
+        field=None if page.field is None else page.field.copy(),
+        operation=None if page.operation is None else copy(page.operation),
+        comment=_raw_comment(page),
+        flags=page.flags,
+        refs=None if page.refs is None else replace(page.refs),
+    )
+
+class DecodeCache:
+    """A bounded LRU cache of decoded fumen strings.
+    Strings are keyed on their version and normalized data, so that strings
+    differing only in the prefix, '?' or the '&' suffix share one entry. A
+    string extending the data of a cached one is decoded from the state after
+    the cached pages instead of from the start.
+    The cached pages are never handed out: decode() returns copies of them,
+    which are cheap since the fields are copied on write.
+    """
+    def __init__(self, max_size=128, max_bytes=None):
+        """Create an empty DecodeCache object.
+        Keyword arguments:
+        max_size: the maximum number of cached strings, None for no limit.
+            (default: 128)
+        max_bytes: the maximum estimated memory taken by the cached pages,
+            None for no limit. (default: None)
+        """
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._heads = {}
+        self._info = CacheInfo()
+
+    def _find_prefix(self, key):
+        # Return the cached entry with the longest data that is a prefix of
+        # the data in key, or None
+        consts, data = key
+        found = None
+        for entry_key in self._heads.get((consts, data[:_HEAD_LENGTH]), ()):
+            entry = self._entries[entry_key]
+            if (data.startswith(entry.data)
+                    and (found is None or len(entry.data) > len(found.data))):
+                found = entry
+        return found
+
+    def _decode(self, key):
+        # Decode the data in key into a new entry, resuming from a prefix
+        consts, data = key
+        prefix = self._find_prefix(key)
+        if prefix is None:
+            pages = []
+            field = Field()
+            state = _DecodeState()
+            fumen_reader = FumenBufferReader(consts, data)
+        else:
+            self._info.resumed += 1
+            pages = list(prefix.pages)
+            field = prefix.field.copy()
+            state = copy(prefix.state)
+            fumen_reader = FumenBufferReader(consts, data[len(prefix.data):])
+            fumen_reader._field_repeat_count = prefix.field_repeat_count
+
+        pages += _decode_pages(fumen_reader, field, state)
+        return _CacheEntry(
+            consts=consts, data=data, pages=tuple(pages), field=field,
+            state=state, field_repeat_count=fumen_reader._field_repeat_count,
+            size=(len(data)
+                  + sum(_PAGE_BYTES + len(_raw_comment(page) or '')
+                        for page in pages))
+        )
+
+    def _add(self, key, entry):
+        # Add the entry to the cache, then evict the least recently used
+        # entries until the limits are satisfied
+        self._entries[key] = entry
+        self._heads.setdefault((key[0], key[1][:_HEAD_LENGTH]), []).append(key)
+        self._info.bytes += entry.size
+        while self._entries and (
+                (self._max_size is not None
+                 and len(self._entries) > self._max_size)
+                or (self._max_bytes is not None
+                    and self._info.bytes > self._max_bytes)):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        # Remove the entry of key from the cache
+        entry = self._entries.pop(key)
+        head = (key[0], key[1][:_HEAD_LENGTH])
+        self._heads[head].remove(key)
+        if not self._heads[head]:
+            del self._heads[head]
+        self._info.bytes -= entry.size
+
+    def decode(self, string):
+        """Decode the given fumen string, using the cache if possible.
+        Return a new list of pages that can be modified freely.
+        """
+        key = _normalize(string)
+        entry = self._entries.get(key)
+        if entry is None:
+            self._info.misses += 1
+            entry = self._decode(key)
+            self._add(key, entry)
+        else:
+            self._info.hits += 1
+            self._entries.move_to_end(key)
+        return [_copy_page(page) for page in entry.pages]
+
+    def cache_info(self):
+        """Return a CacheInfo object of the current statistics."""
+        return replace(self._info, size=len(self._entries))
+
+    def clear(self):
+        """Remove all cached strings and reset the statistics."""
+        self._entries.clear()
+        self._heads.clear()
+        self._info = CacheInfo()
+
+    def __contains__(self, string):
+        """Return whether the given fumen string is cached."""
+        try:
+            return _normalize(string) in self._entries
+        except ValueError:
+            return False
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_right
+from collections.abc import MutableSequence
+from dataclasses import dataclass, replace
+from typing import Any, Optional
+
+from .constant import FumenStringConstants
+from .fumen_buffer import FumenBufferWriter
+from .fumen_codec import _write_page
+from .operation import Mino
+from .quiz import _QuizState
+
+@dataclass
+class _EncodeState:
+    # The encoding state before a page: the writer state, the _QuizState of
+    # the comment, the escaped comment, lock flag and mino of the previous
+    # page, and the number of finished symbols
+    writer_state: Any
+    prev_quiz: _QuizState
+    prev_escaped: Optional[str]
+    prev_lock: bool
+    prev_mino: Mino
+    position: int
+
+    def converges(self, other):
+        # Return whether encoding the same pages from both states gives the
+        # same symbols after the position
+        field, repeat_count, data, repeat_data = self.writer_state
+        other_field, *other_rest = other.writer_state
+        return ((self.prev_quiz, self.prev_lock, self.prev_mino)
+                == (other.prev_quiz, other.prev_lock, other.prev_mino)
+                and [repeat_count, data, repeat_data] == other_rest
+                and field == other_field)
+
+class EncodedPages(MutableSequence):
+    """A list of pages that keeps its fumen string up to date.
+    The encoding state is saved every checkpoint_interval pages. Modifying
+    the list encodes again from the last checkpoint before the modified
+    pages, until the state meets a checkpoint of the previous encoding after
+    them, from which the previous symbols are reused. Pages should be
+    replaced instead of modified in place, as the changes cannot be tracked.
+    """
+    def __init__(self, pages=(), checkpoint_interval=16):
+        """Create an EncodedPages object and encode the given pages.
+        Keyword arguments:
+        pages: the initial pages. (default: ())
+        checkpoint_interval: the number of pages between checkpoints.
+            (default: 16)
+        """
+        self._checkpoint_interval = checkpoint_interval
+        self._pages = []
+        self._data = ''
+        self._checkpoint_indices = [0]
+        self._checkpoints = [_EncodeState(
+            FumenBufferWriter().save_state(), _QuizState(''), '', False,
+            Mino._, 0)]
+        self._end_state = self._checkpoints[0]
+        self[:] = pages
+
+    def _splice(self, start, stop, pages):
+        # Replace self._pages[start:stop] with pages and update the encoding
+        old_data = self._data
+        old_indices = self._checkpoint_indices
+        old_checkpoints = self._checkpoints
+        shift = len(pages) - (stop - start)
+        self._pages[start:stop] = pages
+
+        # Restore the last checkpoint not after start
+        checkpoint = bisect_right(old_indices, start) - 1
+        index = old_indices[checkpoint]
+        state = old_checkpoints[checkpoint]
+        fumen_writer = FumenBufferWriter()
+        fumen_writer.restore_state(state.writer_state)
+        prev = (state.prev_quiz, state.prev_escaped, state.prev_lock,
+                state.prev_mino)
+        pieces = [old_data[:state.position]]
+        position = state.position
+        indices = old_indices[:checkpoint+1]
+        checkpoints = old_checkpoints[:checkpoint+1]
+
+        # The old checkpoints after the new pages, by their new index
+        old_states = {
+            old_index + shift: i for i, old_index in enumerate(old_indices)
+            if old_index >= stop
+        }
+        converged = None
+        while index < len(self._pages):
+            index += 1
+            prev = _write_page(fumen_writer, self._pages[index-1], *prev)
+            finished = repr(fumen_writer.pop_finished())
+            pieces.append(finished)
+            position += len(finished)
+
+            if index in old_states:
+                state = _EncodeState(fumen_writer.save_state(), *prev,
+                                     position)
+                if state.converges(old_checkpoints[old_states[index]]):
+                    converged = old_states[index]
+                    break
+            if index - indices[-1] >= self._checkpoint_interval:
+                indices.append(index)
+                checkpoints.append(_EncodeState(fumen_writer.save_state(),
+                                                *prev, position))
+
+        if converged is None:
+            self._end_state = _EncodeState(fumen_writer.save_state(), *prev,
+                                           position)
+        else:
+            # Reuse the symbols and checkpoints of the previous encoding
+            offset = position - old_checkpoints[converged].position
+            pieces.append(old_data[old_checkpoints[converged].position:])
+            for old_index, old_state in zip(old_indices[converged:],
+                                            old_checkpoints[converged:]):
+                indices.append(old_index + shift)
+                checkpoints.append(replace(
+                    old_state, position=old_state.position+offset))
+            self._end_state = replace(
+                self._end_state, position=self._end_state.position+offset)
+
+        self._data = ''.join(pieces)
+        self._checkpoint_indices = indices
+        self._checkpoints = checkpoints
+
+    def fumen_string(self, prefix=FumenStringConstants.VERSION_INFO,
+            block_size=FumenStringConstants.BLOCK_SIZE):
+        """Return the fumen string of the pages, the same as encode().
+        Keyword arguments:
+        prefix: fumen string prefix. (default: the default VERSION_INFO 'v115@')
+        block_size: Insert a '?' every block_size of characters. (default: the
+            default BLOCK_SIZE 47)
+        """
+        fumen_writer = FumenBufferWriter()
+        fumen_writer.restore_state(self._end_state.writer_state)
+        fumen_writer.move_field_buffer()
+        string = ''.join([prefix, self._data, repr(fumen_writer)])
+        return '?'.join(string[i:i+block_size]
+                        for i in range(0, len(string), block_size))
+
+    def _slice(self, key):
+        # Return (start, stop) of the key, which must be an index or a slice
+        # with step 1
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                raise ValueError('Only slices with step 1 are supported')
+            return start, max(start, stop)
+        if not -len(self) <= key < len(self):
+            raise IndexError(f'Page index out of range: {key}')
+        key %= len(self)
+        return key, key+1
+
+    def __getitem__(self, key):
+        return self._pages[key]
+
+    def __setitem__(self, key, value):
+        """Replace the page(s) at key and update the fumen string."""
+        start, stop = self._slice(key)
+        self._splice(start, stop,
+                     list(value) if isinstance(key, slice) else [value])
+
+    def __delitem__(self, key):
+        """Remove the page(s) at key and update the fumen string."""
+        start, stop = self._slice(key)
+        self._splice(start, stop, [])
+
+    def insert(self, index, page):
+        """Insert the page before index and update the fumen string."""
+        index = min(max(index + len(self) if index < 0 else index, 0),
+                    len(self))
+        self._splice(index, index, [page])
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __str__(self):
+        return self.fumen_string()
@@ -1,10 +1,101 @@
 # -*- coding: utf-8 -*-
 
+import random
+from collections.abc import MutableSequence
+
 from .constant import FieldConstants as Consts
 from .operation import Mino, Rotation, Operation
 
+# The Zobrist keys of each mino in each column, the empty mino having key 0.
+# The key of a line is the XOR of the keys of its minos, and the hash of a
+# field is the XOR of its line keys, each multiplied by an odd number of its
+# row, so that moving lines only needs the line keys to be combined again.
+_RANDOM = random.Random(0x46756d656e)
+_COLUMN_KEYS = tuple(
+    (0,) + tuple(_RANDOM.getrandbits(64) for i in range(len(Mino)-1))
+    for x in range(Consts.WIDTH)
+)
+_ROW_MULTIPLIERS = tuple(_RANDOM.getrandbits(64) | 1
+                         for y in range(Consts.TOTAL_HEIGHT))
+_HASH_MASK = (1 << 64) - 1
+
+class _LineView(MutableSequence):
+    """A line of a Field returned by indexing.
+    Reading gives the current minos of the line, and writing goes through
+    Field.fill(), so that the line stays bound to its field: a copy of the
+    field is never modified through it. The width of a line is fixed.
+    A view is bound to a row, not to the line that was there: after lines
+    move, as in clear_line(), it reads the line now in its row. Slicing,
+    copy() and concatenation give plain lists.
+    """
+    __slots__ = ('_field', '_y')
+
+    def __init__(self, field, y):
+        self._field = field
+        self._y = y
+
+    def __getitem__(self, key):
+        """Return the mino at key, or a list of the minos at the slice key.
+        """
+        return self._field._line(self._y)[key]
+
+    def __setitem__(self, key, value):
+        """Modify the mino(s) at key in the field."""
+        if isinstance(key, slice):
+            xs = range(*key.indices(len(self)))
+            value = list(value)
+            if len(value) != len(xs):
+                raise ValueError('Cannot change the width of a field line')
+            for x, mino in zip(xs, value):
+                self._field.fill(x, self._y, mino)
+        else:
+            self._field.fill(key, self._y, value)
+
+    def __delitem__(self, key):
+        raise TypeError('Cannot change the width of a field line')
+
+    def insert(self, index, value):
+        raise TypeError('Cannot change the width of a field line')
+
+    def __len__(self):
+        return len(self._field._line(self._y))
+
+    def __iter__(self):
+        return iter(self._field._line(self._y))
+
+    def __eq__(self, other):
+        if isinstance(other, _LineView):
+            other = other._field._line(other._y)
+        return self._field._line(self._y) == other
+
+    def __add__(self, other):
+        if isinstance(other, _LineView):
+            other = other.copy()
+        return self._field._line(self._y) + other
+
+    def __radd__(self, other):
+        return other + self._field._line(self._y)
+
+    def copy(self):
+        """Return the minos of the line as a new list."""
+        return self._field._line(self._y)[:]
+
+    def __repr__(self):
+        return repr(self._field._line(self._y))
+
 class Field:
-    """Keep data of a Tetris playing field."""
+    """Keep data of a Tetris playing field.
+    Copies share their lines until either of them is modified (copy-on-write).
+    Indexing returns views of the lines instead of the stored lists: reading
+    them does not unshare the field, and writing to them modifies only the
+    field they were taken from, through fill().
+    Fields compare equal if they have the same minos. As they are mutable,
+    they are not hashable: use frozen() for a snapshot usable as a dict key
+    or in a set.
+    """
+    __slots__ = ('_field', '_garbage', '_shared', '_columns', '_row_keys',
+                 '_hash')
+
     @staticmethod
     def _empty_lines(height):
         empty_lines = [[Mino._] * Consts.WIDTH for y in range(height)]
@@ -26,8 +117,8 @@ class Field:
             if isinstance(field, str):
                 field = field.splitlines()
 
-            if isinstance(field[0], list):
-                lines = [line[:] for line in field]
+            if not isinstance(field[0], str):
+                lines = [list(line) for line in field]
             elif isinstance(field[0], str):
                 lines = [[Mino.parse_name(mino) for mino in line]
                         for line in field[::-1]]
@@ -45,17 +136,120 @@ class Field:
         """
         self._field = self._field_init(Consts.HEIGHT, field)
         self._garbage = self._field_init(Consts.GARBAGE_HEIGHT, garbage)
+        self._shared = False
+        self._columns = None
+        self._row_keys = None
+        self._hash = None
+
+    @classmethod
+    def _from_lines(cls, field, garbage):
+        # Create a Field object owning the given lists of lines, without
+        # parsing or copying them
+        self = cls.__new__(cls)
+        self._field = field
+        self._garbage = garbage
+        self._shared = False
+        self._columns = None
+        self._row_keys = None
+        self._hash = None
+        return self
+
+    def _modify(self, keep_hash=False, keep_columns=False):
+        # Prepare for modification: make a private copy of the lines if they
+        # are shared with a copy. The cached column masks, line keys and hash
+        # are dropped, unless the caller updates them.
+        if self._shared:
+            self._field = [line[:] for line in self._field]
+            self._garbage = [line[:] for line in self._garbage]
+            if self._columns is not None:
+                self._columns = self._columns[:]
+            if self._row_keys is not None:
+                self._row_keys = self._row_keys[:]
+            self._shared = False
+        if not keep_columns:
+            self._columns = None
+        if not keep_hash:
+            self._row_keys = None
+            self._hash = None
+
+    @staticmethod
+    def _line_key(line):
+        # Return the Zobrist key of a line
+        key = 0
+        for keys, mino in zip(_COLUMN_KEYS, line):
+            key ^= keys[mino]
+        return key
+
+    def _hash_lines(self):
+        # Compute the key of each line, from the garbage line upwards, and
+        # the hash of the field
+        self._row_keys = [self._line_key(self._line(y)) for y
+                          in range(-Consts.GARBAGE_HEIGHT, Consts.HEIGHT)]
+        self._combine_keys()
+
+    def _combine_keys(self):
+        # Compute the hash of the field from the line keys
+        hash_ = 0
+        for key, multiplier in zip(self._row_keys, _ROW_MULTIPLIERS):
+            hash_ ^= key * multiplier & _HASH_MASK
+        self._hash = hash_
+
+    def _update_key(self, x, y, mino):
+        # Update the line key and the hash for the mino at grid (x, y) to be
+        # replaced by mino, if they are computed
+        if self._row_keys is not None:
+            keys = _COLUMN_KEYS[x]
+            index = y + Consts.GARBAGE_HEIGHT
+            multiplier = _ROW_MULTIPLIERS[index]
+            key = self._row_keys[index]
+            new_key = key ^ keys[self._line(y)[x]] ^ keys[mino]
+            self._row_keys[index] = new_key
+            self._hash ^= ((key * multiplier ^ new_key * multiplier)
+                           & _HASH_MASK)
+
+    def _move_lines(self, sources):
+        # Rearrange the lines of the playing field: line y becomes the
+        # previous line sources[y], or an empty line if it is None
+        self._modify(keep_hash=True)
+        lines = self._field
+        self._field = [[Mino._] * Consts.WIDTH if y is None else lines[y]
+                       for y in sources]
+        if self._row_keys is not None:
+            keys = self._row_keys[Consts.GARBAGE_HEIGHT:]
+            self._row_keys[Consts.GARBAGE_HEIGHT:] = [
+                0 if y is None else keys[y] for y in sources
+            ]
+            self._combine_keys()
+
+    def _column_masks(self):
+        # Return the occupancy bit mask of each column in the playing field,
+        # with line y at bit y. It is cached and updated by lock(), until the
+        # field is modified otherwise.
+        if self._columns is None:
+            columns = [0] * Consts.WIDTH
+            for y, line in enumerate(self._field):
+                for x, mino in enumerate(line):
+                    if mino is not Mino._:
+                        columns[x] |= 1 << y
+            self._columns = columns
+        return self._columns
+
+    def _line(self, y):
+        # Return line y for reading only, without unsharing
+        return self._field[y] if y >= 0 else self._garbage[-y-1]
 
     def __getitem__(self, key):
         """Return specified line(s) in the field
         The key can be an int (for one line) or a slice (for a set of lines)
         Negative values in slices are deemed as indexing of garbage lines,
         instead of counting from the end of the field.
+        A line is returned as a view that reads and writes the field.
         """
         if isinstance(key, slice):
             return [self[y] for y in self._to_field_range(key)]
         elif isinstance(key, int):
-            return self._field[key] if key >= 0 else self._garbage[-key-1]
+            self._line(key)
+            return _LineView(self, key)
         else:
             raise TypeError(f'Unsupported indexing: {key}')
 
@@ -64,15 +258,21 @@ class Field:
         The key can be an int (for one line) or a slice (for a set of lines)
         Negative values in slices are deemed as indexing of garbage lines,
         instead of counting from the end of the field.
+        The given lines are copied into the field.
         """
+        self._modify()
         if isinstance(key, slice):
             range_ = self._to_field_range(key)
             if range_.step == 1:
                 if range_.start >= 0 and range_.stop >= 0:
-                    self._field[range_.start:range_.stop] = value
+                    self._field[range_.start:range_.stop] = [
+                        list(line) for line in value
+                    ]
                 elif range_.start < 0 and range_.stop < 0:
                     self._garbage[-range_.start-1:
-                                  -range_.stop-1] = reversed(value)
+                                  -range_.stop-1] = [
+                        list(line) for line in reversed(value)
+                    ]
                 elif range_.start < 0 and range_.stop >= 0:
                     self[-range_.start-1:0] = value[:-range_.start]
                     self[0:range_.stop] = value[-range_.start:]
@@ -81,47 +281,109 @@ class Field:
                     self[i] = line
         elif isinstance(key, int):
             if key >= 0:
-                self._field[key] = value
+                self._field[key] = list(value)
             else:
-                self._garbage[-key-1] = value
+                self._garbage[-key-1] = list(value)
         else:
             raise TypeError(f'Unsupported indexing: {key}')
 
+    def _share(self, cls):
+        # Return a new cls object sharing the lines and caches of the field
+        field = cls.__new__(cls)
+        field._field = self._field
+        field._garbage = self._garbage
+        field._shared = self._shared = True
+        field._columns = self._columns
+        field._row_keys = self._row_keys
+        field._hash = self._hash
+        return field
+
     def copy(self):
-        """Return a (deep) copy of the field."""
-        return Field(self._field, self._garbage)
+        """Return a copy of the field.
+        The lines are shared until either field is modified.
+        """
+        return self._share(Field)
+
+    def frozen(self):
+        """Return an immutable FrozenField snapshot of the field.
+        The snapshot has its own copies of the lines, which cannot change
+        with the field it was taken from.
+        """
+        field = FrozenField.__new__(FrozenField)
+        field._field = [line[:] for line in self._field]
+        field._garbage = [line[:] for line in self._garbage]
+        field._shared = False
+        field._columns = None if self._columns is None else self._columns[:]
+        field._row_keys = (None if self._row_keys is None
+                           else self._row_keys[:])
+        field._hash = self._hash
+        return field
+
+    def zobrist_hash(self):
+        """Return the 64-bit Zobrist hash of the field.
+        The hash is computed on the first call, and then updated
+        incrementally by fill(), lock(), clear_line(), rise(), the shifts
+        and mirror(). Writes to the lines returned by indexing go through
+        fill(), so they are tracked too.
+        """
+        if self._hash is None:
+            self._hash_lines()
+        return self._hash
+
+    def __eq__(self, other):
+        """Test if both fields have the same minos.
+        Fields sharing their lines, or with different computed hashes, are
+        compared without looking at the lines.
+        As Field defines __eq__ but not __hash__, Field objects are not
+        hashable, unlike FrozenField objects.
+        """
+        if not isinstance(other, Field):
+            return NotImplemented
+        if self._field is other._field and self._garbage is other._garbage:
+            return True
+        if (self._hash is not None and other._hash is not None
+                and self._hash != other._hash):
+            return False
+        return self._field == other._field and self._garbage == other._garbage
 
     def at(self, x, y):
         """Return the mino at grid (x, y).
         As using Field.__getitem__ requires the ordering field[y][x],
         this method is added for the intuitive field.at(x, y).
         """
-        return self[y][x]
+        return self._line(y)[x]
 
     def fill(self, x, y, mino):
         """Modify the mino at grid (x, y) to mino.
         As using Field.__setitem__ requires the ordering field[y][x] = mino,
         this method is added for the intuitive field.fill(x, y, mino).
         """
-        self[y][x] = mino
+        self._modify(keep_hash=True)
+        self._update_key(x, y, mino)
+        self._line(y)[x] = mino
 
     def is_placeable_at(self, x, y):
         """Test if the desired grid is inside and empty."""
         return (0 <= x < Consts.WIDTH and 0 <= y < Consts.HEIGHT
-                and self[y][x] is Mino._)
+                and self._line(y)[x] is Mino._)
 
     def is_placeable(self, operation):
         """Test if the operation locates within empty region."""
-        return (operation is None
-                or (operation.is_inside()
-                    and all(self[y][x] is Mino._
-                            for x, y in operation.shape())))
+        if operation is None:
+            return True
+        cells, inside, _, _ = operation._shape_entry(
+            operation.mino, operation.rotation, operation.x, operation.y)
+        return inside and all(self._field[y][x] is Mino._ for x, y in cells)
 
     def is_grounded(self, operation):
         """Test if the operation touches the ground if placed."""
-        return (operation is None
-                or (self.is_placeable(operation)
-                    and not self.is_placeable(operation.shifted(0, -1))))
+        if operation is None:
+            return True
+        if not self.is_placeable(operation):
+            return False
+        columns = self._column_masks()
+        return any(y == 0 or (columns[x] >> y-1) & 1
+                   for x, y in operation._cells())
 
     def lock(self, operation, forced=False):
         """Lock an operation in place and modify the field.
@@ -133,8 +395,21 @@ class Field:
         if operation is not None:
             if not (forced or self.is_placeable(operation)):
                 raise ValueError(f'operation cannot be locked: {operation}')
-            for x, y in operation.shape():
+            cells, inside, _, _ = operation._shape_entry(
+                operation.mino, operation.rotation, operation.x, operation.y)
+            self._modify(keep_hash=inside, keep_columns=inside)
+            if self._row_keys is not None:
+                for x, y in cells:
+                    self._update_key(x, y, operation.mino)
+            for x, y in cells:
                 self._field[y][x] = operation.mino
+            columns = self._columns
+            if columns is not None:
+                for x, y in cells:
+                    if operation.mino is Mino._:
+                        columns[x] &= ~(1 << y)
+                    else:
+                        columns[x] |= 1 << y
 
     def drop(self, operation, place=True):
         """Drop an operation to the ground and possibly modify the field.
@@ -146,14 +421,27 @@ class Field:
         if operation is None:
             return None
 
-        prev_operation = operation.shifted(0, 0)
-        for dy in range(-1, -Consts.HEIGHT-1, -1):
-            shifted_operation = operation.shifted(0, dy)
-            if not self.is_placeable(shifted_operation):
-                break
-            prev_operation = shifted_operation
+        if self.is_placeable(operation):
+            # The landing distance of each column is the gap between the
+            # lowest cell of the operation and the highest block below it
+            columns = self._column_masks()
+            bottoms = {}
+            for x, y in operation._cells():
+                if y < bottoms.get(x, Consts.HEIGHT):
+                    bottoms[x] = y
+            prev_operation = operation.shifted(0, -min(
+                y - (columns[x] & ((1 << y) - 1)).bit_length()
+                for x, y in bottoms.items()
+            ))
         else:
-            raise ValueError(f'operation cannot be dropped: {operation}')
+            prev_operation = operation.shifted(0, 0)
+            for dy in range(-1, -Consts.HEIGHT-1, -1):
+                shifted_operation = operation.shifted(0, dy)
+                if not self.is_placeable(shifted_operation):
+                    break
+                prev_operation = shifted_operation
+            else:
+                raise ValueError(f'operation cannot be dropped: {operation}')
 
         if place:
             self.lock(prev_operation)
@@ -163,11 +451,14 @@ class Field:
         """Rise the garbage line(s) into the playing field and clear the
         garbage line(s).
         """
-        self[Consts.GARBAGE_HEIGHT:Consts.HEIGHT]\
-            = self[0:Consts.HEIGHT-Conts.GARBAGE_HEIGHT]
-        self[0:Consts.GARBAGE_HEIGHT] = self[-Consts.GARBAGE_LINE:0]
-        self[-Consts.GARBAGE_HEIGHT:
-             0] = self._empty_lines(Consts.GARBAGE_HEIGHT)
+        self._modify(keep_hash=True)
+        self._field = (self._garbage[::-1]
+                       + self._field[:Consts.HEIGHT-Consts.GARBAGE_HEIGHT])
+        self._garbage = self._empty_lines(Consts.GARBAGE_HEIGHT)
+        if self._row_keys is not None:
+            self._row_keys = ([0] * Consts.GARBAGE_HEIGHT
+                              + self._row_keys[:-Consts.GARBAGE_HEIGHT])
+            self._combine_keys()
 
     def mirror(self, mirror_color=False):
         """Mirror the field.
@@ -175,25 +466,26 @@ class Field:
         mirror_color: if the L-J and Z-S color swap should happen. (default:
             False)
         """
-        for line in self:
+        self._modify(keep_hash=True)
+        for line in self._field:
             line[:] = [mino.mirrored() if mirror_color else mino
                        for mino in reversed(line)]
+        if self._row_keys is not None:
+            self._hash_lines()
 
     def shift_up(self, amount=1):
         """Shift the playing field upwards.
         Keyword arguments:
         amount: (default: 1)
         """
-        self[amount:] = self[0:Consts.HEIGHT-amount]
-        self[0:amount] = self._empty_lines(amount)
+        self._move_lines([None] * amount + list(range(Consts.HEIGHT-amount)))
 
     def shift_down(self, amount=1):
         """Shift the playing field downwards.
         Keyword arguments:
         amount: (default: 1)
         """
-        self[0:Consts.HEIGHT-amount] = self[amount:]
-        self[Consts.HEIGHT-amount:] = self._empty_lines(amount)
+        self._move_lines(list(range(amount, Consts.HEIGHT)) + [None] * amount)
 
     def shift_left(self, amount=1, warp=False):
         """Shift or warp the playing field to the left.
@@ -202,12 +494,15 @@ class Field:
         warp: if the left-most columns should be warpped to the right.
             (default: False)
         """
+        self._modify(keep_hash=True)
         for line in self._field:
             line[:] = (line[amount:]
                        + (line[:amount] if warp else [Mino._]*amount))
         for line in self._garbage:
             line[:] = (line[amount:]
                        + (line[:amount] if warp else [Mino._]*amount))
+        if self._row_keys is not None:
+            self._hash_lines()
 
     def shift_right(self, amount=1, warp=False):
         """Shift or warp the playing field to the right.
@@ -216,27 +511,26 @@ class Field:
         warp: if the right-most columns should be warpped to the left.
             (default: False)
         """
+        self._modify(keep_hash=True)
         for line in self._field:
             line[:] = ((line[-amount:] if warp else [Mino._]*amount)
                        + line[:-amount])
         for line in self._garbage:
             line[:] = ((line[-amount:] if warp else [Mino._]*amount)
                        + line[:-amount])
+        if self._row_keys is not None:
+            self._hash_lines()
 
     def is_lineclear_at(self, y):
         """Test if a line is filled."""
-        return Mino._ not in self[y]
+        return Mino._ not in self._line(y)
 
     def clear_line(self):
         """Clear filled lines on the field."""
-        lines = []
-        n_lineclear = 0
-        for line in self:
-            if Mino._ in line:
-                lines.append(line)
-            else:
-                n_lineclear += 1
-        self._field = lines + self._empty_lines(n_lineclear)
+        n_lineclear = sum(Mino._ not in line for line in self._field)
+        if n_lineclear:
+            self._move_lines([y for y, line in enumerate(self._field)
+                              if Mino._ in line] + [None] * n_lineclear)
         return n_lineclear
 
     def apply_action(self, action):
@@ -250,11 +544,15 @@ class Field:
             if action.mirror:
                 self.mirror()
 
+    def column_heights(self):
+        """Return the height of the highest block in each column."""
+        return [column.bit_length() for column in self._column_masks()]
+
     def height(self):
         """Return the y coordinate of the highest non-empty mino."""
         height = Consts.HEIGHT
         while (height > 0
-                and all(mino is Mino._ for mino in self[height - 1])):
+                and all(mino is Mino._ for mino in self._line(height - 1))):
             height -= 1
         return height
 
@@ -265,8 +563,8 @@ class Field:
         if truncated:
             stop = min(stop, self.height())
         return separator.join(
-            reversed([''.join(mino.name for mino in line)
-                      for line in self[start:stop]])
+            reversed([''.join(mino.name for mino in self._line(y))
+                      for y in range(start, stop)])
         )
 
     def string(self, truncated=True, separator='\n', with_garbage=True):
@@ -285,3 +583,26 @@ class Field:
 
     def __str__(self):
         return self.string()
+
+class FrozenField(Field):
+    """An immutable snapshot of a Field, usable as a dict key or in a set.
+    Modifying it raises TypeError, and indexing returns copies of the lines.
+    Its copy() is a mutable Field.
+    """
+    __slots__ = ()
+
+    def _modify(self, keep_hash=False, keep_columns=False):
+        raise TypeError('FrozenField cannot be modified')
+
+    def __getitem__(self, key):
+        """Return a copy of the specified line(s) in the field."""
+        if isinstance(key, int):
+            return self._line(key)[:]
+        return super().__getitem__(key)
+
+    def frozen(self):
+        """Return the field itself, as it is already immutable."""
+        return self
+
+    def __hash__(self):
+        return self.zobrist_hash()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from .action import ActionCodec
+from .constant import FieldConstants as Consts
+from .fumen_codec import _get_reader, _read_comment
+from .operation import Mino, Operation
+from .quiz import _QuizState
+
+@dataclass
+class FumenArrays():
+    """A dataclass for storing decoded pages as parallel NumPy arrays.
+    Page i of the n-th fumen string is at index page_offsets[n] + i.
+    Keyword arguments:
+    fields: uint8 array of shape (pages, TOTAL_HEIGHT, WIDTH), with the mino
+        at grid (x, y) at fields[page, y+GARBAGE_HEIGHT, x].
+    mino: uint8 array of the operation minos, 0 (Mino._) for no operation.
+    rotation: uint8 array of the operation rotations.
+    x: int8 array of the operation x coordinates.
+    y: int8 array of the operation y coordinates.
+    lock, mirror, colorize, rise, quiz: bool arrays of the page flags.
+    comment_data: the comments of all pages joined together.
+    comment_offsets: int64 array of length pages+1, the comment of page i
+        being comment_data[comment_offsets[i]:comment_offsets[i+1]].
+    page_offsets: int64 array of length len(strings)+1, the pages of the
+        n-th string being the indices from page_offsets[n] to
+        page_offsets[n+1].
+    """
+    fields: np.ndarray
+    mino: np.ndarray
+    rotation: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    lock: np.ndarray
+    mirror: np.ndarray
+    colorize: np.ndarray
+    rise: np.ndarray
+    quiz: np.ndarray
+    comment_data: str
+    comment_offsets: np.ndarray
+    page_offsets: np.ndarray
+
+    def comment(self, index):
+        """Return the comment of the page at index."""
+        return self.comment_data[self.comment_offsets[index]:
+                                 self.comment_offsets[index+1]]
+
+    def __len__(self):
+        return len(self.mino)
+
+class _ArrayBuilder:
+    # Growable arrays of pages, doubled in capacity when full
+    _PAGE_ARRAYS = (
+        ('mino', np.uint8), ('rotation', np.uint8), ('x', np.int8),
+        ('y', np.int8), ('lock', np.bool_), ('mirror', np.bool_),
+        ('colorize', np.bool_), ('rise', np.bool_), ('quiz', np.bool_),
+        ('comment_offsets', np.int64),
+    )
+
+    def __init__(self, capacity):
+        self.count = 0
+        self.capacity = max(capacity, 1)
+        self.fields = np.zeros((self.capacity, Consts.TOTAL_HEIGHT,
+                                Consts.WIDTH), np.uint8)
+        for name, dtype in self._PAGE_ARRAYS:
+            setattr(self, name, np.zeros(self.capacity, dtype))
+        self.comments = []
+        self.comment_length = 0
+
+    def _resize(self, capacity):
+        self.capacity = capacity
+        self.fields.resize((capacity, Consts.TOTAL_HEIGHT, Consts.WIDTH),
+                           refcheck=False)
+        for name, _ in self._PAGE_ARRAYS:
+            getattr(self, name).resize(capacity, refcheck=False)
+
+    def add_page(self, board, mino, rotation, x, y, lock, mirror, colorize,
+                 rise, quiz, comment):
+        if self.count == self.capacity:
+            self._resize(self.capacity * 2)
+        i = self.count
+        # The board is stored from the top line, the arrays from the bottom
+        self.fields[i] = board[::-1]
+        if mino is not Mino._:
+            self.mino[i] = mino
+            self.rotation[i] = rotation
+            self.x[i] = x
+            self.y[i] = y
+        self.lock[i] = lock
+        self.mirror[i] = mirror
+        self.colorize[i] = colorize
+        self.rise[i] = rise
+        self.quiz[i] = quiz
+        self.comment_offsets[i] = self.comment_length
+        self.comments.append(comment)
+        self.comment_length += len(comment)
+        self.count += 1
+
+    def build(self, page_offsets):
+        # Shrink the arrays to the page count, with one more comment offset
+        self._resize(self.count)
+        self.comment_offsets.resize(self.count + 1, refcheck=False)
+        self.comment_offsets[self.count] = self.comment_length
+        return FumenArrays(
+            fields=self.fields, comment_data=''.join(self.comments),
+            page_offsets=np.array(page_offsets, np.int64),
+            **{name: getattr(self, name) for name, _ in self._PAGE_ARRAYS}
+        )
+
+def _lock(board, mino, rotation, x, y):
+    # Lock the operation on the board, as Field.lock() does
+    if not Operation.is_inside_at(mino, rotation, x, y):
+        raise ValueError(f'operation cannot be locked: '
+                         f'{Operation(mino, rotation, x, y)}')
+    cells = Operation._shape_entry(mino, rotation, x, y)[0]
+    lines = [Consts.HEIGHT - cell_y - 1 for _, cell_y in cells]
+    columns = [cell_x for cell_x, _ in cells]
+    if board[lines, columns].any():
+        raise ValueError(f'operation cannot be locked: '
+                         f'{Operation(mino, rotation, x, y)}')
+    board[lines, columns] = mino
+
+def _clear_line(board):
+    # Clear the filled lines of the playing field on the board
+    playing_field = board[:Consts.HEIGHT]
+    filled = playing_field.all(axis=1)
+    if filled.any():
+        remaining = playing_field[~filled]
+        cleared = Consts.HEIGHT - len(remaining)
+        playing_field[cleared:] = remaining
+        playing_field[:cleared] = 0
+
+def _rise(board):
+    # Rise the garbage lines into the playing field and clear them
+    board[:Consts.HEIGHT-Consts.GARBAGE_HEIGHT] = board[
+        Consts.GARBAGE_HEIGHT:Consts.HEIGHT].copy()
+    board[Consts.HEIGHT-Consts.GARBAGE_HEIGHT:Consts.HEIGHT] = board[
+        Consts.HEIGHT:]
+    board[Consts.HEIGHT:] = 0
+
+def _decode_into(builder, string):
+    # Decode the pages of one fumen string into the builder
+    fumen_reader = _get_reader(string)
+    consts = fumen_reader._consts
+    operations, flags, _ = ActionCodec._tables(consts)
+    operation_count = len(operations)
+    # The board is kept in the fumen data order: from the top line to the
+    # garbage line, so that the field diffs apply to a flat view of it.
+    # Shorter fields of older versions are aligned at the bottom.
+    board = np.zeros((Consts.TOTAL_HEIGHT, Consts.WIDTH), np.uint8)
+    flat_board = board.reshape(-1)[
+        (Consts.HEIGHT-consts.HEIGHT)*Consts.WIDTH:]
+
+    page_count = 0
+    prev_quiz = _QuizState('')
+    prev_lock = False
+    prev_mino = Mino._
+    while fumen_reader:
+        field_diffs = fumen_reader.read_field_diffs()
+        if field_diffs is not None:
+            diffs, lengths = zip(*field_diffs)
+            # (mino + diff - 8) % 9 for each cell, as Mino.shifted() does
+            flat_board += np.repeat(np.array(diffs, np.uint8) + 1,
+                                    np.array(lengths) + 1)
+            flat_board %= len(Mino)
+
+        q, r = divmod(fumen_reader.poll(3), operation_count)
+        mino, rotation, x, y = operations[r]
+        rise, mirror, colorize, has_comment, lock = flags[q % 32]
+        comment, prev_quiz = _read_comment(fumen_reader, has_comment,
+                                           page_count, prev_quiz, prev_lock,
+                                           prev_mino)
+        builder.add_page(board, mino, rotation, x, y, lock, mirror, colorize,
+                         rise, True, str(comment))
+
+        if lock:
+            if mino.is_colored():
+                _lock(board, mino, rotation, x, y)
+            _clear_line(board)
+            if rise:
+                _rise(board)
+            if mirror:
+                board[:Consts.HEIGHT] = board[:Consts.HEIGHT, ::-1]
+
+        page_count += 1
+        prev_lock = lock
+        prev_mino = mino
+
+def decode_to_arrays(strings, capacity=1024):
+    """Decode fumen strings into one FumenArrays of all their pages.
+    No Page, Field or Operation objects are created on the way.
+    Keyword arguments:
+    strings: an iterable of fumen strings.
+    capacity: the number of pages to preallocate the arrays for. The arrays
+        grow as needed. (default: 1024)
+    """
+    builder = _ArrayBuilder(capacity)
+    page_offsets = [0]
+    for string in strings:
+        _decode_into(builder, string)
+        page_offsets.append(builder.count)
+    return builder.build(page_offsets)
@@ -2,9 +2,7 @@
 
 from __future__ import annotations
 
-from collections import deque
-from dataclasses import dataclass
-from typing import Deque
+from operator import sub
 
 from .action import Action, ActionCodec
 from .comment import CommentCodec
@@ -12,46 +10,134 @@ from .constant import FieldConstants, FumenStringConstants
 from .field import Field
 from .js_escape import escape, unescape
 
-class FumenBuffer(deque):
+class FumenBuffer:
     """The buffer for fumen data.
-    deque is used for faster element removal from the front.
+    The symbol values are kept in a bytearray with a cursor at the front, so
+    that reading from the front neither moves nor copies the data.
     """
     ENCODING_TABLE = ('ABCDEFGHIJKLMNOPQRSTUVWXYZ'
                       'abcdefghijklmnopqrstuvwxyz0123456789+/')
     DECODING_TABLE = {char: i for i, char in enumerate(ENCODING_TABLE)}
     TABLE_LENGTH = len(ENCODING_TABLE)
+    _ENCODING_BYTES = ENCODING_TABLE.encode('ascii').ljust(256, b'\0')
+    _DECODING_BYTES = bytes.maketrans(_ENCODING_BYTES[:TABLE_LENGTH],
+                                      bytes(range(TABLE_LENGTH)))
+    _COMPACT_THRESHOLD = 4096
 
     def __init__(self, data=''):
         """Create a FumenBuffer object with the given data."""
         try:
-            super().__init__(self.DECODING_TABLE[char] for char in data)
-        except KeyError as e:
-            raise ValueError(f'Unsupported fumen string character: {e}') from None
+            data = data.encode('ascii')
+        except UnicodeEncodeError as e:
+            invalid = e.object[e.start]
+        else:
+            invalid = data.translate(
+                None, self._ENCODING_BYTES[:self.TABLE_LENGTH])[:1]
+            invalid = invalid.decode('ascii')
+        if invalid:
+            raise ValueError(f'Unsupported fumen string character: '
+                             f'{invalid!r}')
+        self._data = bytearray(data.translate(self._DECODING_BYTES))
+        self._cursor = 0
+
+    def _compact(self):
+        # Drop the consumed data once it takes most of the bytearray
+        if (self._cursor >= self._COMPACT_THRESHOLD
+                and self._cursor * 2 >= len(self._data)):
+            del self._data[:self._cursor]
+            self._cursor = 0
 
     def poll(self, poll_length):
         """Return the value represented by poll_length symbols at the front.
         The symbol ordering is big-endian.
         """
-        poll_stack = []
-        try:
-            for i in range(poll_length):
-                poll_stack.append(self.popleft())
-        except IndexError as e:
+        data = self._data
+        cursor = self._cursor
+        if cursor + poll_length > len(data):
             raise ValueError(f'Cannot poll {poll_length} items: '
-                             f'only {len(poll_stack)} present') from None
+                             f'only {len(self)} present')
+        self._cursor = cursor + poll_length
 
+        if poll_length == 2:
+            return data[cursor] + (data[cursor+1] << 6)
+        elif poll_length == 3:
+            return (data[cursor] + (data[cursor+1] << 6)
+                    + (data[cursor+2] << 12))
+        elif poll_length == 5:
+            return (data[cursor] + (data[cursor+1] << 6)
+                    + (data[cursor+2] << 12) + (data[cursor+3] << 18)
+                    + (data[cursor+4] << 24))
         value = 0
-        while poll_stack:
-            value = poll_stack.pop() + value * self.TABLE_LENGTH
+        for i in range(cursor + poll_length - 1, cursor - 1, -1):
+            value = data[i] + value * self.TABLE_LENGTH
         return value
 
+    def poll_values(self, poll_length, count):
+        """Return a list of count values at the front, each represented by
+        poll_length symbols. The symbol ordering is big-endian.
+        """
+        total_length = poll_length * count
+        data = self._data
+        cursor = self._cursor
+        if cursor + total_length > len(data):
+            raise ValueError(f'Cannot poll {total_length} items: '
+                             f'only {len(self)} present')
+        self._cursor = cursor + total_length
+
+        symbols = data[cursor:cursor+total_length]
+        if poll_length == 5:
+            return [a + (b << 6) + (c << 12) + (d << 18) + (e << 24)
+                    for a, b, c, d, e in zip(symbols[0::5], symbols[1::5],
+                                             symbols[2::5], symbols[3::5],
+                                             symbols[4::5])]
+        values = []
+        for start in range(0, total_length, poll_length):
+            value = 0
+            for i in range(start + poll_length - 1, start - 1, -1):
+                value = symbols[i] + value * self.TABLE_LENGTH
+            values.append(value)
+        return values
+
+    def poll_buffer(self, poll_length):
+        """Remove poll_length symbols at the front as a new FumenBuffer."""
+        poll_length = min(poll_length, len(self))
+        buffer = FumenBuffer()
+        buffer._data = self._data[self._cursor:self._cursor+poll_length]
+        self._cursor += poll_length
+        self._compact()
+        return buffer
+
     def push(self, value, push_length=1):
         """Push the value with push_length symbols representing it.
         The symbol ordering is big-endian.
         """
         for i in range(push_length):
-            value, remainder = divmod(value, self.TABLE_LENGTH)
-            self.append(remainder)
+            self._data.append(value & 0x3F)
+            value >>= 6
+
+    def append(self, value):
+        """Append one symbol value at the back."""
+        self._data.append(value)
+
+    def popleft(self):
+        """Remove and return one symbol value at the front."""
+        if not len(self):
+            raise IndexError('pop from an empty FumenBuffer')
+        self._cursor += 1
+        return self._data[self._cursor-1]
+
+    def extend(self, other):
+        """Append the symbol values in other at the back."""
+        if isinstance(other, FumenBuffer):
+            self._data += other._data[other._cursor:]
+        else:
+            self._data.extend(other)
+        self._compact()
+
+    def clear(self):
+        """Remove all symbols."""
+        self._data = bytearray()
+        self._cursor = 0
 
     def fumen_string(self, prefix=FumenStringConstants.VERSION_INFO,
             block_size=FumenStringConstants.BLOCK_SIZE):
@@ -70,59 +156,129 @@ class FumenBuffer(deque):
 
     def __iadd__(self, other):
         """Append another FumenBuffer at the back of self."""
-        for item in other:
-            self.append(item)
+        self.extend(other)
         return self
 
+    def _index(self, key):
+        # Convert an index relative to the front to one in the bytearray
+        if not -len(self) <= key < len(self):
+            raise IndexError('FumenBuffer index out of range')
+        return self._cursor + key % len(self)
+
+    def __getitem__(self, key):
+        return self._data[self._index(key)]
+
+    def __setitem__(self, key, value):
+        self._data[self._index(key)] = value
+
+    def __len__(self):
+        return len(self._data) - self._cursor
+
+    def __iter__(self):
+        return iter(self._data[self._cursor:])
+
     def __str__(self):
         return self.fumen_string()
 
     def __repr__(self):
-        return ''.join(self.ENCODING_TABLE[value] for value in self)
+        return (self._data[self._cursor:].translate(self._ENCODING_BYTES)
+                .decode('ascii'))
 
 class FumenBufferReader(FumenBuffer):
-    def __init__(self, consts, data=''):
-        """Create a FumenBufferReader object with given data."""
+    def __init__(self, consts, data='', source=None):
+        """Create a FumenBufferReader object with given data.
+        Keyword arguments:
+        consts: the field constants of the fumen version.
+        data: the fumen data (without the version prefix). (default: '')
+        source: an iterable of data chunks read after data when more symbols
+            are needed, None for no further data. (default: None)
+        """
         super().__init__(data)
         self._consts = consts
+        self._source = iter(() if source is None else source)
         self._field_previous = Field()
         self._field_repeat_count = -1
         self._comment_previous = None
 
-    def _apply_field_diff(self, index, diff, length):
-        # Apply the decoded field diff on the stored field.
+    def _fill(self, length):
+        # Read chunks from the source until length symbols are present
+        while len(self) < length:
+            chunk = next(self._source, None)
+            if chunk is None:
+                break
+            self.extend(FumenBuffer(chunk))
+
+    def poll(self, poll_length):
+        """Return the value represented by poll_length symbols at the front.
+        More data is read from the source if needed.
+        """
+        if len(self) < poll_length:
+            self._fill(poll_length)
+        return super().poll(poll_length)
+
+    def poll_values(self, poll_length, count):
+        """Return a list of count values at the front, each represented by
+        poll_length symbols. More data is read from the source if needed.
+        """
+        if len(self) < poll_length * count:
+            self._fill(poll_length * count)
+        return super().poll_values(poll_length, count)
+
+    def __bool__(self):
+        """Return whether any data remains, reading the source if needed."""
+        self._fill(1)
+        return len(self) > 0
+
+    def _apply_field_diff(self, field, index, diff, length):
+        # Apply the decoded field diff on the given field.
         if diff != 8:
             diff -= 8
             for i in range(index, index+length+1):
                 y, x = divmod(i, self._consts.WIDTH)
                 y = self._consts.HEIGHT - y - 1
-                self._field_previous.fill(
-                    x, y, self._field_previous.at(x, y).shifted(diff)
-                )
+                field.fill(x, y, field.at(x, y).shifted(diff))
 
-    def read_field(self):
-        """Read one playing field from the data.
-        Return a new or repeated Field object.
+    def read_field_diffs(self):
+        """Read the diffs of one playing field from the data.
+        Return a list of (diff, length) runs covering the whole field, or None
+        if the field is repeated from the previous one.
         """
         if self._field_repeat_count > 0:
             self._field_repeat_count -= 1
-            return self._field_previous, False
+            return None
 
         diff, length = divmod(self.poll(2),
                               self._consts.TOTAL_BLOCK_COUNT)
         if diff == 8 and length == self._consts.TOTAL_BLOCK_COUNT - 1:
             self._field_repeat_count = self.poll(1)
-            return self._field_previous, False
+            return None
         else:
-            self._apply_field_diff(0, diff, length)
+            field_diffs = [(diff, length)]
             field_index = length + 1
 
             while field_index < self._consts.TOTAL_BLOCK_COUNT:
                 diff, length = divmod(self.poll(2),
                                       self._consts.TOTAL_BLOCK_COUNT)
-                self._apply_field_diff(field_index, diff, length)
+                field_diffs.append((diff, length))
                 field_index += length + 1
-            return self._field_previous, True
+            return field_diffs
+
+    def apply_field_diffs(self, field, field_diffs):
+        """Apply the field diffs from read_field_diffs() on the given field.
+        """
+        if field_diffs is not None:
+            field_index = 0
+            for diff, length in field_diffs:
+                self._apply_field_diff(field, field_index, diff, length)
+                field_index += length + 1
+
+    def read_field(self):
+        """Read one playing field from the data.
+        Return a new or repeated Field object.
+        """
+        field_diffs = self.read_field_diffs()
+        self.apply_field_diffs(self._field_previous, field_diffs)
+        return self._field_previous, field_diffs is not None
 
     def read_action(self):
         """Read one Action object from the data."""
@@ -132,7 +288,7 @@ class FumenBufferReader(FumenBuffer):
         """Read one variable-lenght comment string from the data."""
         length = self.poll(2)
         comment = unescape(CommentCodec.decode(
-            [self.poll(5) for i in range((length+3)//4)]
+            self.poll_values(5, (length+3)//4)
         )[:length])
         self._comment_previous = comment
         return comment
@@ -146,11 +302,6 @@ class FumenBufferWriter(FumenBuffer):
         self._field_repeat_count = -1
         self._field_repeat_buffer = FumenBuffer()
 
-    def _field_diff(self, field, x, y):
-        # Return the difference between previous and current field at (x, y)
-        y = self._consts.HEIGHT - y - 1
-        return field.at(x, y) - self._field_previous.at(x, y)
-
     def _write_field_diff(self, diff, length):
         self._field_repeat_buffer.push(
             (diff+8)*self._consts.TOTAL_BLOCK_COUNT+length, 2
@@ -158,35 +309,84 @@ class FumenBufferWriter(FumenBuffer):
 
     def move_field_buffer(self):
         """Move the additional buffer for field repeating count.
-        Due to the slow random access of deque, one additional buffer is used
-        to account for incoming data after wrting a repeating count.
+        One additional buffer is used to account for incoming data after
+        wrting a repeating count, as the count may still be increased.
         One should call this method before outputting fumen string to avoid
         incorrect results.
         """
         self += self._field_repeat_buffer
         self._field_repeat_buffer.clear()
 
+    def pop_finished(self):
+        """Remove and return the symbols that are final as a FumenBuffer.
+        The last symbol is kept if it is a field repeating count that may still
+        be increased by the following fields.
+        """
+        count = len(self)
+        if 0 <= self._field_repeat_count < self.TABLE_LENGTH - 1:
+            count -= 1
+        return self.poll_buffer(count)
+
+    def save_state(self):
+        """Return the state of the writer, to be passed to restore_state().
+        The state includes the symbols not yet removed by pop_finished().
+        """
+        repeat_buffer = self._field_repeat_buffer
+        return (self._field_previous.copy(), self._field_repeat_count,
+                bytes(self._data[self._cursor:]),
+                bytes(repeat_buffer._data[repeat_buffer._cursor:]))
+
+    def restore_state(self, state):
+        """Restore the writer to a state returned by save_state()."""
+        field, self._field_repeat_count, data, repeat_data = state
+        self._field_previous = field.copy()
+        self._data = bytearray(data)
+        self._cursor = 0
+        self._field_repeat_buffer.clear()
+        self._field_repeat_buffer.extend(repeat_data)
+
+    def _write_field_diffs(self, field):
+        # Write the runs of differences between the previous and the given
+        # field, from the top line to the garbage line. Rows without any
+        # change are added to the current run as a whole.
+        # Return the last run as (diff, length).
+        width = self._consts.WIDTH
+        previous = self._field_previous
+        diff = None
+        count = 0
+        for y in range(self._consts.HEIGHT-1, -self._consts.GARBAGE_HEIGHT-1,
+                       -1):
+            line = field._line(y)
+            prev_line = previous._line(y)
+            if line is prev_line or line == prev_line:
+                if diff == 0:
+                    count += width
+                    continue
+                cell_diffs = (0,)
+                cell_count = width
+            else:
+                cell_diffs = map(sub, line, prev_line)
+                cell_count = 1
+            for cell_diff in cell_diffs:
+                if cell_diff == diff:
+                    count += cell_count
+                else:
+                    if count:
+                        self._write_field_diff(diff, count-1)
+                    diff = cell_diff
+                    count = cell_count
+        return diff, count-1
+
     def write_field(self, field):
         """Write the given field to the buffer."""
-        if field is None:
+        if field is None or field == self._field_previous:
             diff = 0
-            prev_diff = 0
             length = self._consts.TOTAL_BLOCK_COUNT - 1
         else:
-            prev_diff = self._field_diff(field, 0, 0)
-            length = -1
-            for y in range(self._consts.TOTAL_HEIGHT):
-                for x in range(self._consts.WIDTH):
-                    diff = self._field_diff(field, x, y)
-                    if diff != prev_diff:
-                        self._write_field_diff(prev_diff, length)
-                        length = 0
-                        prev_diff = diff
-                    else:
-                        length += 1
+            diff, length = self._write_field_diffs(field)
 
         if diff or length != self._consts.TOTAL_BLOCK_COUNT - 1:
-            self._write_field_diff(prev_diff, length)
+            self._write_field_diff(diff, length)
             self.move_field_buffer()
             self._field_repeat_count = -1
             self._field_previous = field.copy()
@@ -195,7 +395,7 @@ class FumenBufferWriter(FumenBuffer):
             self._field_repeat_count += 1
         else:
             self._field_repeat_count = 0
-            self._write_field_diff(prev_diff, length)
+            self._write_field_diff(diff, length)
             self._field_repeat_buffer.push(self._field_repeat_count, 1)
             self.move_field_buffer()
 
@@ -205,6 +405,15 @@ class FumenBufferWriter(FumenBuffer):
             ActionCodec.encode(self._consts, action), 3)
         self._field_previous.apply_action(action)
 
+    def write_escaped_comment(self, escaped_comment):
+        """Write the given comment, already escaped and truncated to 4095
+        characters, to the buffer.
+        """
+        length, encoded_comments = CommentCodec.encode(escaped_comment)
+        self._field_repeat_buffer.push(length, 2)
+        for value in encoded_comments:
+            self._field_repeat_buffer.push(value, 5)
+
     def write_comment(self, comment, prev_comment):
         """Write the given comment to the buffer.
         Return whether the comment is different from the previous one.
@@ -213,10 +422,7 @@ class FumenBufferWriter(FumenBuffer):
         prev_comment = escape(prev_comment)[:4095]
 
         if comment != prev_comment:
-            length, encoded_comments = CommentCodec.encode(comment)
-            self._field_repeat_buffer.push(length, 2)
-            for value in encoded_comments:
-                self._field_repeat_buffer.push(value, 5)
+            self.write_escaped_comment(comment)
             return True
         else:
             return False
@@ -1,15 +1,29 @@
 # -*- coding: utf-8 -*-
 
+import io
+import itertools
+import os
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field as dataclass_field, replace
+from string import whitespace
+from typing import Optional
+
 from .action import Action
-from .constant import FieldConstants, FieldConstants110
+from .constant import FieldConstants, FieldConstants110, FumenStringConstants
+from .field import Field
 from .fumen_buffer import FumenBufferReader, FumenBufferWriter
-from .js_escape import escape, escaped_compare
+from .js_escape import escape
 from .operation import Mino, Rotation, Operation
-from .page import Page, Flags, Refs
-from .quiz import Quiz
+from .page import Page, Flags, Refs, _raw_comment
+from .quiz import _QuizState
 
-def _get_reader(string):
-    # Initially parse the given input, and preapre the FumenBufferReader.
+_IGNORED_DATA_CHARS = str.maketrans('', '', '?' + whitespace)
+
+def _normalize(string):
+    # Return (consts, data) of the given input: the field constants of its
+    # version, and its data without the prefix, '?' and the '&' suffix.
     string = string.split('&')[0]
     data = None
     for version in ['115', '110']:
@@ -24,86 +38,405 @@ def _get_reader(string):
         raise ValueError('Unsupported fumen version')
 
     if version == '110':
-        return FumenBufferReader(FieldConstants110, data)
+        return FieldConstants110, data
     else:
-        return FumenBufferReader(FieldConstants, data)
+        return FieldConstants, data
 
-def decode(string):
-    """Decode the given fumen string into usable data."""
-    fumen_reader = _get_reader(string)
-    pages = []
-    prev_comment = ''
-    prev_lock = False
-    prev_mino = Mino._
-    field_ref_index = None
-    comment_ref_index = None
+def _get_reader(string):
+    # Initially parse the given input, and preapre the FumenBufferReader.
+    return FumenBufferReader(*_normalize(string))
+
+def _read_comment(fumen_reader, has_comment, page_count, prev_quiz,
+                  prev_lock, prev_mino):
+    # Return (comment, quiz) of a page, given the _QuizState of the previous
+    # page: the comment is read from the reader if the page has one,
+    # otherwise it is carried over from the previous page as a quiz stepped
+    # by the previous locked mino. A carried comment is the _QuizState if
+    # its string is not built yet, and quiz is the _QuizState of the page.
+    carried = prev_quiz.carry(prev_mino if prev_lock else None)
+    if has_comment:
+        comment = fumen_reader.read_comment()
+        return comment, _QuizState(comment)
+    elif page_count:
+        return carried.known_comment(), carried
+    else:
+        return '', prev_quiz
+
+@dataclass
+class _DecodeState:
+    # The state carried between pages while decoding
+    page_count: int = 0
+    prev_quiz: _QuizState = dataclass_field(
+        default_factory=lambda: _QuizState(''))
+    prev_lock: bool = False
+    prev_mino: Mino = Mino._
+    field_ref_index: Optional[int] = None
+    comment_ref_index: Optional[int] = None
+
+def _read_pages(fumen_reader, state=None):
+    # Read the pages from the reader without touching any field.
+    # Yield (field_diffs, action, page) for each page, where the page has no
+    # field and field_diffs is from FumenBufferReader.read_field_diffs().
+    # The given _DecodeState is updated after each page, so that reading can
+    # be resumed from it on a reader of the following data.
+    if state is None:
+        state = _DecodeState()
+    page_count = state.page_count
+    prev_quiz = state.prev_quiz
+    prev_lock = state.prev_lock
+    prev_mino = state.prev_mino
+    field_ref_index = state.field_ref_index
+    comment_ref_index = state.comment_ref_index
 
     while fumen_reader:
-        field, field_modified = fumen_reader.read_field()
+        field_diffs = fumen_reader.read_field_diffs()
         action = fumen_reader.read_action()
 
-        quiz = Quiz(prev_comment)
-        if prev_lock:
-            quiz.step(prev_mino)
+        comment, prev_quiz = _read_comment(fumen_reader, action.comment,
+                                           page_count, prev_quiz, prev_lock,
+                                           prev_mino)
 
-        if action.comment:
-            comment = fumen_reader.read_comment()
-        else:
-            comment = (None if quiz is None else str(quiz)) if pages else ''
-
-        pages.append(Page(
-            field=field.copy(),
+        page = Page(
             operation=(None if action.operation.mino is Mino._
                        else action.operation),
             comment=comment,
-            flags=Flags(action.lock, action.mirror, action.colorize,
-                        action.rise, (quiz is not None)),
-            refs=Refs(field=None if field_modified else field_ref_index,
+            flags=Flags._shared(action.lock, action.mirror, action.colorize,
+                                action.rise, True),
+            refs=Refs(field=None if field_diffs else field_ref_index,
                       comment=None if action.comment else comment_ref_index)
-        ))
+        )
 
-        field.apply_action(action)
-        if action.comment or len(pages) == 1:
-            comment_ref_index = len(pages) - 1
-        if field_modified or len(pages) == 1:
-            field_ref_index = len(pages) - 1
+        page_count += 1
+        if action.comment or page_count == 1:
+            comment_ref_index = page_count - 1
+        if field_diffs or page_count == 1:
+            field_ref_index = page_count - 1
 
-        prev_comment = comment
         prev_lock = action.lock
         prev_mino = action.operation.mino
+        state.page_count = page_count
+        state.prev_quiz = prev_quiz
+        state.prev_lock = prev_lock
+        state.prev_mino = prev_mino
+        state.field_ref_index = field_ref_index
+        state.comment_ref_index = comment_ref_index
+
+        yield field_diffs, action, page
+
+def _decode_pages(fumen_reader, field=None, state=None):
+    # Yield the fully decoded pages from the reader one by one.
+    # The given field is the one before the next page, and is modified as
+    # the pages are decoded.
+    if field is None:
+        field = Field()
+
+    for field_diffs, action, page in _read_pages(fumen_reader, state):
+        fumen_reader.apply_field_diffs(field, field_diffs)
+        page.field = field.copy()
+        yield page
+        field.apply_action(action)
+
+def decode(string):
+    """Decode the given fumen string into usable data."""
+    return list(_decode_pages(_get_reader(string)))
+
+def _iter_chunks(source, chunk_size):
+    # Yield text chunks from a string or a text file-like object
+    if isinstance(source, str):
+        for i in range(0, len(source), chunk_size):
+            yield source[i:i+chunk_size]
+    else:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def _iter_data(data, chunks):
+    # Yield the cleaned fumen data in data and the chunks, up to the first '&'
+    yield data.translate(_IGNORED_DATA_CHARS)
+    for chunk in chunks:
+        data, *rest = chunk.split('&', maxsplit=1)
+        yield data.translate(_IGNORED_DATA_CHARS)
+        if rest:
+            break
+
+def _find_version(string):
+    # Return (index, version) of the first version prefix in string, or None
+    matches = [(string.find(prefix+version), version)
+               for version in ['115', '110'] for prefix in 'vmd']
+    return min(((match, version) for match, version in matches
+                if match != -1), default=None)
+
+def _get_stream_reader(chunks):
+    # Find the version prefix in the chunks, and prepare a FumenBufferReader
+    # reading the following data from the remaining chunks.
+    head = ''
+    found = None
+    ended = False
+    for chunk in chunks:
+        data, *rest = chunk.split('&', maxsplit=1)
+        head += data
+        ended = bool(rest)
+        found = _find_version(head)
+        if ended or (found is not None and found[0] + 5 <= len(head)):
+            break
+        if found is None:
+            head = head[-4:]
+    if found is None:
+        raise ValueError('Unsupported fumen version')
+
+    match, version = found
+    consts = FieldConstants110 if version == '110' else FieldConstants
+    return FumenBufferReader(
+        consts, source=_iter_data(head[match+5:], () if ended else chunks)
+    )
+
+def iter_decode(source, chunk_size=4096):
+    """Decode the given fumen string or text file page by page.
+    The input is read in chunks as the pages are consumed, so that only a
+    bounded amount of data is kept in memory. The first version prefix found
+    is used, and whitespaces and '?' in the data are ignored.
+    Keyword arguments:
+    source: a fumen string, or a text file-like object with read().
+    chunk_size: the number of characters read at a time. (default: 4096)
+    """
+    return _decode_pages(_get_stream_reader(_iter_chunks(source, chunk_size)))
+
+class LazyPages(Sequence):
+    """A read-only sequence of decoded pages with fields built on demand.
+    The field of a page is rebuilt from the nearest keyframe, a field
+    snapshot stored every keyframe_interval pages while replaying.
+    """
+    def __init__(self, fumen_reader, keyframe_interval=16):
+        """Read all pages from the reader, without building any field.
+        Keyword arguments:
+        fumen_reader: the FumenBufferReader to read from.
+        keyframe_interval: the number of pages between keyframes.
+            (default: 16)
+        """
+        self._fumen_reader = fumen_reader
+        self._keyframe_interval = keyframe_interval
+        self._field_diffs = []
+        self._actions = []
+        self._pages = []
+        for field_diffs, action, page in _read_pages(fumen_reader):
+            self._field_diffs.append(field_diffs)
+            self._actions.append(action)
+            self._pages.append(page)
+        self._keyframes = {}
+
+    def _field_at(self, index):
+        # Return a new Field of the page at index, replayed from a keyframe
+        start = index - index % self._keyframe_interval
+        while start > 0 and start not in self._keyframes:
+            start -= self._keyframe_interval
+
+        if start in self._keyframes:
+            field = self._keyframes[start].copy()
+        else:
+            field = Field()
+            self._fumen_reader.apply_field_diffs(field, self._field_diffs[0])
+            self._keyframes[0] = field.copy()
+
+        for i in range(start+1, index+1):
+            field.apply_action(self._actions[i-1])
+            self._fumen_reader.apply_field_diffs(field, self._field_diffs[i])
+            if i % self._keyframe_interval == 0:
+                self._keyframes[i] = field.copy()
+        return field
+
+    def __getitem__(self, key):
+        """Return the page(s) at key, building the field(s) as needed."""
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        if not -len(self) <= key < len(self):
+            raise IndexError(f'Page index out of range: {key}')
+        key %= len(self)
+        page = self._pages[key]
+        return replace(page, field=self._field_at(key),
+                       comment=_raw_comment(page))
+
+    def __len__(self):
+        return len(self._pages)
+
+def decode_lazy(string, keyframe_interval=16):
+    """Decode the given fumen string into a LazyPages sequence.
+    Only the actions and comments are decoded at once, and the field of a
+    page is built when the page is indexed.
+    Keyword arguments:
+    string: the fumen string.
+    keyframe_interval: the number of pages between field snapshots.
+        (default: 16)
+    """
+    return LazyPages(_get_reader(string), keyframe_interval)
+
+def _escape_comment(comment):
+    # Return the comment escaped and truncated to 4095 characters. Only the
+    # first 4095 characters are escaped, as each gives at least one.
+    return escape(comment[:4095] if comment else comment)[:4095]
+
+def _write_page(fumen_writer, page, prev_quiz, prev_escaped, prev_lock,
+                prev_mino):
+    # Write the page with the writer, given the _QuizState of the comment,
+    # the escaped and truncated comment (None if not escaped yet), the lock
+    # flag and the mino of the previous page. Return those of the given page.
+    flags = Flags() if page.flags is None else page.flags
+    operation = (
+        Operation(Mino._, Rotation.REVERSE, 0, FieldConstants.HEIGHT-1)
+        if page.operation is None else page.operation
+    )
+    carried = prev_quiz.carry(prev_mino if prev_lock else None)
+    if carried is not prev_quiz:
+        prev_escaped = None
+    comment = _raw_comment(page)
+    if comment is carried:
+        # A comment decoded as carried over is the same as the carried one
+        # without comparing them
+        escaped = prev_escaped
+        quiz = carried
+    else:
+        if prev_escaped is None:
+            prev_escaped = _escape_comment(str(carried))
+        escaped = _escape_comment(page.comment)
+        quiz = (comment if isinstance(comment, _QuizState)
+                else _QuizState(comment if comment else ''))
 
-    return pages
+    fumen_writer.write_field(page.field)
+    fumen_writer.write_action(
+        Action(operation,
+        flags.rise,
+        flags.mirror,
+        flags.colorize,
+        comment is not carried and escaped != prev_escaped,
+        flags.lock))
+    if comment is not carried and escaped != prev_escaped:
+        fumen_writer.write_escaped_comment(escaped)
+    return quiz, escaped, flags.lock, operation.mino
+
+class Encoder:
+    """Encode pages one by one into a text sink.
+    The part of the fumen string that can no longer change is written to the
+    sink as soon as each page is added.
+    """
+    def __init__(self, sink, prefix=FumenStringConstants.VERSION_INFO,
+                 block_size=FumenStringConstants.BLOCK_SIZE):
+        """Create an Encoder object writing to sink.
+        Keyword arguments:
+        sink: a text file-like object with write().
+        prefix: fumen string prefix. (default: the default VERSION_INFO 'v115@')
+        block_size: Insert a '?' every block_size of characters. (default: the
+            default BLOCK_SIZE 47)
+        """
+        self._sink = sink
+        self._block_size = block_size
+        self._fumen_writer = FumenBufferWriter()
+        self._written_length = 0
+        self._flushed = False
+        self._prev_quiz = _QuizState('')
+        self._prev_escaped = ''
+        self._prev_lock = False
+        self._prev_mino = Mino._
+        self._write(prefix)
+
+    def _write(self, string):
+        # Write string to the sink, inserting '?' every block_size characters
+        while string:
+            if (self._written_length
+                    and self._written_length % self._block_size == 0):
+                self._sink.write('?')
+            length = self._block_size - self._written_length % self._block_size
+            self._sink.write(string[:length])
+            self._written_length += len(string[:length])
+            string = string[length:]
+
+    def add_page(self, page):
+        """Encode the given page and write the finished data to the sink."""
+        if self._flushed:
+            raise ValueError('Cannot add pages to a flushed Encoder')
+
+        (self._prev_quiz, self._prev_escaped, self._prev_lock,
+            self._prev_mino) = _write_page(
+                self._fumen_writer, page, self._prev_quiz,
+                self._prev_escaped, self._prev_lock, self._prev_mino)
+
+        self._write(repr(self._fumen_writer.pop_finished()))
+
+    def flush(self):
+        """Write all remaining data to the sink and finish the fumen string.
+        No page can be added after flushing.
+        """
+        if not self._flushed:
+            self._fumen_writer.move_field_buffer()
+            self._write(repr(self._fumen_writer))
+            self._fumen_writer.clear()
+            self._flushed = True
 
 def encode(pages):
     """Encode the given pages into a fumen string."""
-    fumen_writer = FumenBufferWriter()
-    prev_comment = ''
-    prev_lock = False
-    prev_mino = Mino._
-
+    string_io = io.StringIO()
+    encoder = Encoder(string_io)
     for page in pages:
-        flags = Flags() if page.flags is None else page.flags
-        operation = (
-            Operation(Mino._, Rotation.REVERSE, 0, FieldConstants.HEIGHT-1)
-            if page.operation is None else page.operation
-        )
-        quiz = Quiz(prev_comment)
-        if prev_lock:
-            quiz.step(prev_mino)
-        prev_comment = str(quiz)
-
-        fumen_writer.write_field(page.field)
-        fumen_writer.write_action(
-            Action(operation,
-            flags.rise,
-            flags.mirror,
-            flags.colorize,
-            not escaped_compare(page.comment, prev_comment, 4095),
-            flags.lock))
-        fumen_writer.write_comment(page.comment, prev_comment)
-        prev_comment = page.comment if page.comment else ''
-        prev_lock = flags.lock
-        prev_mino = operation.mino
-
-    fumen_writer.move_field_buffer()
-    return str(fumen_writer)
+        encoder.add_page(page)
+    encoder.flush()
+    return string_io.getvalue()
+
+def _decode_or_error(string):
+    # Decode in a worker process, returning the exception instead of raising
+    try:
+        return decode(string)
+    except Exception as e:
+        return e
+
+def _encode_or_error(pages):
+    # Encode in a worker process, returning the exception instead of raising
+    try:
+        return encode(pages)
+    except Exception as e:
+        return e
+
+def _map_chunk(function, chunk):
+    # Map function over one chunk of items in a worker process
+    return [function(item) for item in chunk]
+
+def _map_many(function, items, workers, chunksize):
+    # Map function over items with a process pool, yielding results in order.
+    # Only a few chunks per worker are submitted at a time, so that a large
+    # input is never fully loaded into memory.
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    items = iter(items)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(itertools.islice(items, chunksize))
+                if not chunk:
+                    break
+                pending.append(executor.submit(_map_chunk, function, chunk))
+            if not pending:
+                break
+            yield from pending.popleft().result()
+
+def decode_many(strings, workers=None, chunksize=64):
+    """Decode the given fumen strings with a pool of processes.
+    Return an iterator of results in the input order. The result of a string
+    failed to decode is the raised exception instead of a list of pages.
+    Keyword arguments:
+    strings: an iterable of fumen strings.
+    workers: the number of worker processes, None for the number of CPUs.
+        (default: None)
+    chunksize: the number of strings sent to a worker at a time. (default: 64)
+    """
+    return _map_many(_decode_or_error, strings, workers, chunksize)
+
+def encode_many(pages_list, workers=None, chunksize=64):
+    """Encode the given lists of pages with a pool of processes.
+    Return an iterator of results in the input order. The result of a list
+    failed to encode is the raised exception instead of a fumen string.
+    Keyword arguments:
+    pages_list: an iterable of lists of pages.
+    workers: the number of worker processes, None for the number of CPUs.
+        (default: None)
+    chunksize: the number of lists sent to a worker at a time. (default: 64)
+    """
+    return _map_many(_encode_or_error, pages_list, workers, chunksize)
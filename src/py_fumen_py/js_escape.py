@@ -5,22 +5,35 @@ import re
 RESERVING_CHARS = ("0123456789QWERTYUIOPASDFGHJKLZXCVBNM"
                   "qwertyuiopasdfghjklzxcvbnm@*_+-./")
 
-def escape(string):
-    """Implement escape() from JavaScript since tetris-fumen uses it."""
-    string = '' if string is None else string
-    result = ''
-    for char in string:
+class _EscapeTable(dict):
+    # The str.translate() table of escape(), filled on demand
+    def __missing__(self, char_ord):
+        char = chr(char_ord)
         if char in RESERVING_CHARS:
-            result += char
+            escaped = char
         else:
-            char_ord = ord(char)
-            result += ('%{0:02X}'.format(char_ord) if char_ord < 256
+            escaped = ('%{0:02X}'.format(char_ord) if char_ord < 256
                        else '%u{0:04X}'.format(char_ord))
-    return result
+        self[char_ord] = escaped
+        return escaped
+
+_ESCAPE_TABLE = _EscapeTable()
+_ESCAPED_PATTERN = re.compile('[^' + re.escape(RESERVING_CHARS) + ']')
+_UNESCAPE_PATTERN = re.compile(r'%u([a-fA-F0-9]{4})|%([a-fA-F0-9]{2})')
+
+def escape(string):
+    """Implement escape() from JavaScript since tetris-fumen uses it."""
+    if not string:
+        return ''
+    if _ESCAPED_PATTERN.search(string) is None:
+        return string
+    return string.translate(_ESCAPE_TABLE)
 
 def unescape(string):
     """Implement unescape() from JavaScript since tetris-fumen uses it."""
-    return re.sub(r'%u([a-fA-F0-9]{4})|%([a-fA-F0-9]{2})', _parse, string)
+    if '%' not in string:
+        return string
+    return _UNESCAPE_PATTERN.sub(_parse, string)
 
 def _parse(match):
     # Parse the regex matches in usescape()
@@ -109,7 +109,7 @@ class Rotation(IntEnum):
             Rotation.LEFT: Rotation.RIGHT,
         }.get(self, self)
 
-@dataclass
+@dataclass(slots=True)
 class Operation():
     """A dataclass for storing information about a tetrimino operation."""
     SHAPES = {
@@ -144,22 +144,56 @@ class Operation():
                  Rotation.LEFT: [[0, 0], [0, -1], [-1, 0], [-1, 1]]},
         Mino.X: {},
     }
+    _SHAPE_TABLE = {}
 
     mino: Mino
     rotation: Rotation
     x: int
     y: int
 
+    @classmethod
+    def _make_shape_entry(cls, mino, rotation, x, y):
+        # Return (cells, inside, row_masks, mask) of an operation.
+        # row_masks is a tuple of (y, bits of x) for each occupied line, and
+        # mask is the bitboard with grid (x, y) at bit
+        # (y+GARBAGE_HEIGHT)*WIDTH+x, both being None if not inside.
+        cells = tuple((x+dx, y+dy) for dx, dy
+                      in cls.SHAPES.get(mino, {}).get(rotation, [[0, 0]]))
+        inside = all(0 <= x < Consts.WIDTH and 0 <= y < Consts.HEIGHT
+                     for x, y in cells)
+        if not inside:
+            return cells, False, None, None
+
+        rows = {}
+        for x, y in cells:
+            rows[y] = rows.get(y, 0) | 1 << x
+        row_masks = tuple(sorted(rows.items()))
+        mask = 0
+        for y, row in row_masks:
+            mask |= row << (y+Consts.GARBAGE_HEIGHT) * Consts.WIDTH
+        return cells, True, row_masks, mask
+
+    @classmethod
+    def _shape_entry(cls, mino, rotation, x, y):
+        # Return the shape entry from the table, which is filled on demand
+        # with the operations centered inside the field
+        key = (mino, rotation, x, y)
+        entry = cls._SHAPE_TABLE.get(key)
+        if entry is None:
+            entry = cls._make_shape_entry(mino, rotation, x, y)
+            if 0 <= x < Consts.WIDTH and 0 <= y < Consts.HEIGHT:
+                cls._SHAPE_TABLE[key] = entry
+        return entry
+
     @classmethod
     def shape_at(cls, mino, rotation, x=0, y=0):
-        return [[x+dx, y+dy] for dx, dy
-                in cls.SHAPES.get(mino, {}).get(rotation, [[0, 0]])]
+        """Return a new list of [x, y] of the cells of an operation."""
+        return [[cell_x, cell_y] for cell_x, cell_y
+                in cls._shape_entry(mino, rotation, x, y)[0]]
 
     @classmethod
     def is_inside_at(cls, mino, rotation, x, y):
-        return all(0 <= x < Consts.WIDTH
-                   and 0 <= y < Consts.HEIGHT
-                   for x, y in cls.shape_at(mino, rotation, x, y))
+        return cls._shape_entry(mino, rotation, x, y)[1]
 
     def shift(self, dx, dy):
         self.x += dx
@@ -194,6 +228,22 @@ class Operation():
     def shape(self):
         return self.shape_at(self.mino, self.rotation, self.x, self.y)
 
+    def _cells(self):
+        # Return the tuple of (x, y) of the cells from the shape table
+        return self._shape_entry(self.mino, self.rotation, self.x, self.y)[0]
+
     def is_inside(self):
-        return self.is_inside_at(self.mino, self.rotation, self.x, self.y)
+        return self._shape_entry(self.mino, self.rotation, self.x, self.y)[1]
+
+    def row_masks(self):
+        """Return (y, bits of x) for each line the operation occupies.
+        None is returned if the operation is not inside the field.
+        """
+        return self._shape_entry(self.mino, self.rotation, self.x, self.y)[2]
 
+    def mask(self):
+        """Return the bitboard of the operation, with grid (x, y) at bit
+        (y+GARBAGE_HEIGHT)*WIDTH+x.
+        None is returned if the operation is not inside the field.
+        """
+        return self._shape_entry(self.mino, self.rotation, self.x, self.y)[3]
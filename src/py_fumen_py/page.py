@@ -5,10 +5,12 @@ from typing import Optional
 
 from .field import Field
 from .operation import Operation
+from .quiz import _QuizState
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Flags():
     """A datacalss for storing decoded page flags.
+    Flags objects are immutable, so that the decoded pages can share them.
     Keyword arguments:
     lock: if the operation is locked and filled field lines are cleared.
     mirror: if the field is mirrored.
@@ -22,15 +24,31 @@ class Flags():
     rise: Optional[bool] = False
     quiz: Optional[bool] = False
 
-@dataclass
+    @classmethod
+    def _shared(cls, lock, mirror, colorize, rise, quiz):
+        # Return the shared Flags object of the given flags, creating it on
+        # first use
+        key = (lock, mirror, colorize, rise, quiz)
+        flags = _SHARED_FLAGS.get(key)
+        if flags is None:
+            flags = _SHARED_FLAGS[key] = cls(*key)
+        return flags
+
+# The shared Flags objects by their flags
+_SHARED_FLAGS = {}
+
+@dataclass(slots=True)
 class Refs():
     """A dataclass for storing decoded page repeating references."""
     field: Optional[int] = None
     comment: Optional[int] = None
 
-@dataclass
+@dataclass(slots=True)
 class Page():
-    """A dataclass for storing decoded page."""
+    """A dataclass for storing decoded page.
+    The comment of a decoded page carried over from the previous page is
+    only built as a string when it is first read.
+    """
     field: Optional[Field] = None
     operation: Optional[Operation] = None
     comment: Optional[str] = None
@@ -42,3 +60,20 @@ class Page():
         return (f'{{field:{field_separator}{self.field}, '
                 f'operation: {self.operation}, comment: {self.comment}, '
                 f'flags: {self.flags}, refs: {self.refs}}}')
+
+# A decoded page may hold its comment as the _QuizState carried over from the
+# previous page, which is converted when the comment is read
+_comment_slot = Page.comment
+
+def _get_comment(page):
+    comment = _comment_slot.__get__(page)
+    if isinstance(comment, _QuizState):
+        comment = str(comment)
+        _comment_slot.__set__(page, comment)
+    return comment
+
+def _raw_comment(page):
+    # Return the stored comment of the page, without converting it
+    return _comment_slot.__get__(page)
+
+Page.comment = property(_get_comment, _comment_slot.__set__)
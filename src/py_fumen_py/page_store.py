@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import struct
+from collections.abc import Sequence
+from itertools import chain
+
+from .constant import FieldConstants as Consts
+from .field import Field
+from .operation import Mino, Rotation, Operation
+from .page import Page, Flags, Refs
+
+# The store file is made of the following sections, in order:
+#   header: magic and page count
+#   field blocks: TOTAL_BLOCK_COUNT bytes per page, one mino per byte, from
+#       the garbage line upwards
+#   action records: flag bits, operation, and refs (-1 for None) per page
+#   comment offsets: page count + 1 byte offsets into the comment heap
+#   comment heap: the UTF-8 encoded comments
+_MAGIC = b'FUMENPS1'
+_HEADER = struct.Struct('<8sQ')
+_RECORD = struct.Struct('<BBBbbii')
+_OFFSET = struct.Struct('<Q')
+
+_LOCK = 1
+_MIRROR = 2
+_COLORIZE = 4
+_RISE = 8
+_QUIZ = 16
+_OPERATION = 32
+_COMMENT = 64
+
+_MINOS = tuple(Mino)
+_ROTATIONS = tuple(Rotation)
+
+class PageStoreWriter:
+    """Write pages one by one into a page store file.
+    The field blocks are written as the pages are added, while the action
+    records and comments are kept until the store is closed.
+    """
+    def __init__(self, sink):
+        """Create a PageStoreWriter object writing to sink.
+        Keyword arguments:
+        sink: a seekable binary file-like object with write() and seek().
+        """
+        self._sink = sink
+        self._start = sink.tell()
+        self._page_count = 0
+        self._records = bytearray()
+        self._comment_offsets = bytearray(_OFFSET.pack(0))
+        self._comments = bytearray()
+        self._closed = False
+        sink.write(_HEADER.pack(_MAGIC, 0))
+
+    @staticmethod
+    def _field_block(field):
+        # Return the bytes of the field, built from its current content
+        if field is None:
+            return bytes(Consts.TOTAL_BLOCK_COUNT)
+        return bytes(chain.from_iterable(
+            field._line(y)
+            for y in range(-Consts.GARBAGE_HEIGHT, Consts.HEIGHT)
+        ))
+
+    def add_page(self, page):
+        """Write the field of the given page and keep its other data."""
+        if self._closed:
+            raise ValueError('Cannot add pages to a closed PageStoreWriter')
+
+        flags = Flags() if page.flags is None else page.flags
+        refs = Refs() if page.refs is None else page.refs
+        bits = ((_LOCK if flags.lock else 0)
+                | (_MIRROR if flags.mirror else 0)
+                | (_COLORIZE if flags.colorize else 0)
+                | (_RISE if flags.rise else 0)
+                | (_QUIZ if flags.quiz else 0))
+        operation = page.operation
+        if operation is None:
+            operation = Operation(Mino._, Rotation.REVERSE, 0, 0)
+        else:
+            bits |= _OPERATION
+        if page.comment is not None:
+            bits |= _COMMENT
+            self._comments += page.comment.encode('utf-8', 'surrogatepass')
+
+        self._sink.write(self._field_block(page.field))
+        self._records += _RECORD.pack(
+            bits, operation.mino, operation.rotation, operation.x,
+            operation.y, -1 if refs.field is None else refs.field,
+            -1 if refs.comment is None else refs.comment
+        )
+        self._comment_offsets += _OFFSET.pack(len(self._comments))
+        self._page_count += 1
+
+    def close(self):
+        """Write the remaining sections and the header to the sink.
+        No page can be added after closing. The sink is not closed.
+        """
+        if not self._closed:
+            self._sink.write(self._records)
+            self._sink.write(self._comment_offsets)
+            self._sink.write(self._comments)
+            end = self._sink.tell()
+            self._sink.seek(self._start)
+            self._sink.write(_HEADER.pack(_MAGIC, self._page_count))
+            self._sink.seek(end)
+            self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def write_page_store(path, pages):
+    """Write the given pages, such as the output of decode(), into a page
+    store file at path.
+    """
+    with open(path, 'wb') as sink, PageStoreWriter(sink) as writer:
+        for page in pages:
+            writer.add_page(page)
+
+class PageStore(Sequence):
+    """A read-only sequence of the pages in a memory-mapped page store file.
+    A page and its field are built from the mapped data when indexed.
+    """
+    def __init__(self, path):
+        """Open and memory-map the page store file at path."""
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._page_count = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC:
+            self._mmap.close()
+            raise ValueError(f'Unsupported page store file: {path}')
+
+        self._fields_start = _HEADER.size
+        self._records_start = (self._fields_start
+                               + self._page_count * Consts.TOTAL_BLOCK_COUNT)
+        self._offsets_start = (self._records_start
+                               + self._page_count * _RECORD.size)
+        self._comments_start = (self._offsets_start
+                                + (self._page_count+1) * _OFFSET.size)
+
+    def _index(self, index):
+        # Return the index within range(len(self)), or raise IndexError
+        if not -len(self) <= index < len(self):
+            raise IndexError(f'Page index out of range: {index}')
+        return index % len(self)
+
+    def field_block(self, index):
+        """Return a read-only memoryview of the field bytes of the page at
+        index, the mino at grid (x, y) being at (y+GARBAGE_HEIGHT)*WIDTH+x.
+        """
+        index = self._index(index)
+        start = self._fields_start + index * Consts.TOTAL_BLOCK_COUNT
+        return memoryview(self._mmap)[start:start+Consts.TOTAL_BLOCK_COUNT]
+
+    def _field_at(self, index):
+        # Return a new Field built from the field block of the page at index
+        start = self._fields_start + index * Consts.TOTAL_BLOCK_COUNT
+        block = self._mmap[start:start+Consts.TOTAL_BLOCK_COUNT]
+        lines = [list(map(_MINOS.__getitem__, block[i:i+Consts.WIDTH]))
+                 for i in range(0, Consts.TOTAL_BLOCK_COUNT, Consts.WIDTH)]
+        return Field._from_lines(lines[Consts.GARBAGE_HEIGHT:],
+                                 lines[Consts.GARBAGE_HEIGHT-1::-1])
+
+    def _comment_at(self, index):
+        # Return the comment string of the page at index
+        start, = _OFFSET.unpack_from(self._mmap,
+                                     self._offsets_start + index*_OFFSET.size)
+        stop, = _OFFSET.unpack_from(
+            self._mmap, self._offsets_start + (index+1)*_OFFSET.size)
+        return self._mmap[self._comments_start+start:
+                          self._comments_start+stop].decode('utf-8',
+                                                            'surrogatepass')
+
+    def __getitem__(self, key):
+        """Return the page(s) at key, building the field(s) as needed."""
+        if isinstance(key, slice):
+            return [self[i] for i in range(*key.indices(len(self)))]
+        key = self._index(key)
+
+        bits, mino, rotation, x, y, field_ref, comment_ref = (
+            _RECORD.unpack_from(self._mmap,
+                                self._records_start + key*_RECORD.size))
+        return Page(
+            field=self._field_at(key),
+            operation=(Operation(_MINOS[mino], _ROTATIONS[rotation], x, y)
+                       if bits & _OPERATION else None),
+            comment=self._comment_at(key) if bits & _COMMENT else None,
+            flags=Flags._shared(bool(bits & _LOCK), bool(bits & _MIRROR),
+                                bool(bits & _COLORIZE), bool(bits & _RISE),
+                                bool(bits & _QUIZ)),
+            refs=Refs(field=None if field_ref == -1 else field_ref,
+                      comment=None if comment_ref == -1 else comment_ref)
+        )
+
+    def __len__(self):
+        return self._page_count
+
+    def close(self):
+        """Unmap the page store file."""
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from time import perf_counter
+from typing import Dict, List
+
+from . import fumen_buffer, fumen_codec
+from .action import ActionCodec
+from .comment import CommentCodec
+from .field import Field
+from .fumen_buffer import FumenBuffer, FumenBufferReader, FumenBufferWriter
+from .page import Page
+from .quiz import _QuizState
+
+# The functions timed in each phase, as (owner, attribute name). Module
+# functions are patched in the modules calling them.
+_PHASE_TARGETS = {
+    'buffer': [(fumen_codec, '_normalize'), (FumenBuffer, '__init__')],
+    'field_codec': [(FumenBufferReader, 'read_field_diffs'),
+                    (FumenBufferReader, 'apply_field_diffs'),
+                    (FumenBufferReader, 'read_field'),
+                    (FumenBufferWriter, 'write_field')],
+    'action_codec': [(ActionCodec, 'decode'), (ActionCodec, 'encode')],
+    'comment_codec': [(CommentCodec, 'decode'), (CommentCodec, 'encode')],
+    'escape': [(fumen_codec, 'escape'), (fumen_buffer, 'escape'),
+               (fumen_buffer, 'unescape')],
+    'quiz': [(_QuizState, 'carry')],
+    'field_update': [(Field, 'copy'), (Field, 'apply_action')],
+}
+# The functions counted as allocating an object of each type
+_ALLOCATION_TARGETS = {
+    'Page': [(Page, '__init__')],
+    'Field': [(Field, '__init__'), (Field, 'copy'), (Field, '_from_lines')],
+}
+PHASES = tuple(_PHASE_TARGETS)
+
+_active = False
+
+@dataclass
+class PhaseStats():
+    """A dataclass for storing the statistics of one codec phase.
+    Keyword arguments:
+    calls: the number of calls to the functions of the phase.
+    time: the time spent in the phase in seconds, excluding the time spent
+        in the other phases called from it.
+    """
+    calls: int = 0
+    time: float = 0.0
+
+@dataclass
+class CodecProfile():
+    """A dataclass for storing the statistics recorded by profile_codec().
+    Keyword arguments:
+    phases: the PhaseStats of each phase in PHASES.
+    allocations: the number of allocated objects, by type name.
+    elapsed: the total time spent in the profiled block in seconds.
+    """
+    phases: Dict[str, PhaseStats] = field(
+        default_factory=lambda: {phase: PhaseStats() for phase in PHASES})
+    allocations: Dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(_ALLOCATION_TARGETS, 0))
+    elapsed: float = 0.0
+    _stack: List[float] = field(default_factory=list, repr=False)
+
+    def other_time(self):
+        """Return the time spent outside of all phases in seconds."""
+        return self.elapsed - sum(stats.time for stats in self.phases.values())
+
+    def report(self):
+        """Return a table of the statistics as a string."""
+        lines = [f'{"phase":<14}{"calls":>10}{"time (ms)":>12}{"share":>8}']
+        rows = [(phase, stats.calls, stats.time)
+                for phase, stats in self.phases.items()]
+        rows.append(('other', '', self.other_time()))
+        for phase, calls, time in rows:
+            share = time / self.elapsed if self.elapsed else 0.0
+            lines.append(f'{phase:<14}{calls:>10}{time*1000:>12.3f}'
+                         f'{share:>8.1%}')
+        lines.append(', '.join(f'{count} {name} objects allocated'
+                               for name, count in self.allocations.items()))
+        return '\n'.join(lines)
+
+def _timed(profile, stats, function):
+    # Wrap function to add its calls and exclusive time to stats
+    stack = profile._stack
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        stack.append(0.0)
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            stats.calls += 1
+            stats.time += elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+    return wrapper
+
+def _counted(profile, name, function):
+    # Wrap function to count its calls as allocations of name
+    allocations = profile.allocations
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        allocations[name] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+def _patch(owner, name, wrap, originals):
+    # Replace the attribute with its wrapped function, keeping the
+    # original attribute in originals to be restored
+    attribute = vars(owner)[name]
+    originals.append((owner, name, attribute))
+    if isinstance(attribute, (classmethod, staticmethod)):
+        setattr(owner, name, type(attribute)(wrap(attribute.__func__)))
+    else:
+        setattr(owner, name, wrap(attribute))
+
+@contextmanager
+def profile_codec(callback=None):
+    """Record the time and calls of each codec phase, and the allocated
+    pages and fields, while the context is active.
+    Yield a CodecProfile object, which is complete when the context exits.
+    The codec functions are only wrapped while the context is active, so
+    that there is no overhead otherwise. As the wrapping is global, only one
+    profile can be active at a time, and other threads are profiled too.
+    Keyword arguments:
+    callback: a function called with the CodecProfile object when the
+        context exits, None for no callback. (default: None)
+    """
+    global _active
+    if _active:
+        raise RuntimeError('Another profile_codec() is already active')
+
+    profile = CodecProfile()
+    originals = []
+    _active = True
+    try:
+        for phase, targets in _PHASE_TARGETS.items():
+            stats = profile.phases[phase]
+            for owner, name in targets:
+                _patch(owner, name,
+                       lambda function: _timed(profile, stats, function),
+                       originals)
+        for type_name, targets in _ALLOCATION_TARGETS.items():
+            for owner, name in targets:
+                _patch(owner, name,
+                       lambda function: _counted(profile, type_name, function),
+                       originals)
+
+        start = perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.elapsed = perf_counter() - start
+    finally:
+        for owner, name, attribute in reversed(originals):
+            setattr(owner, name, attribute)
+        _active = False
+
+    if callback is not None:
+        callback(profile)
@@ -1,12 +1,35 @@
 # -*- coding: utf-8 -*-
 
 import copy
+import re
 
 class Quiz:
     """A class for dealing the comment as a quiz if possible.
     Note that this class is largely differnt from tetris-fumen.Quiz.
     This class is more similar to the quiz system on fumen.zui.jp.
     """
+    _NON_MINO_PATTERN = re.compile('[^IOLZTJS]+')
+    _PARSED_CACHE_SIZE = 4096
+    _parsed = {}
+
+    @classmethod
+    def _parse_cached(cls, comment):
+        # Return parse_comment(comment), memoized for quiz comments
+        parsed = cls._parsed.get(comment)
+        if parsed is None:
+            parsed = cls.parse_comment(comment)
+            if parsed[0]:
+                cls._cache_parsed(comment, parsed)
+        return parsed
+
+    @classmethod
+    def _cache_parsed(cls, comment, parsed):
+        # Keep the parsed result of the comment, forgetting all of them
+        # once there are too many
+        if len(cls._parsed) >= cls._PARSED_CACHE_SIZE:
+            cls._parsed.clear()
+        cls._parsed[comment] = parsed
+
     @staticmethod
     def parse_comment(comment):
         """Extract quiz information from the comment.
@@ -40,10 +63,35 @@ class Quiz:
         """Create a Quiz object with the given comment."""
         if isinstance(comment, str):
             (self._is_valid, self._hold, self._active, self._nexts,
-                self._residue) = self.parse_comment(comment)
+                self._residue) = self._parse_cached(comment)
         else:
             raise TypeError('Unsupported comment type')
 
+    @classmethod
+    def carry_comment(cls, comment, mino=None):
+        """Return the comment carried over to the next page.
+        That is the comment as a quiz, stepped by mino if it is given. A
+        comment that is not a quiz is returned as is without any parsing.
+        """
+        if not isinstance(comment, str):
+            raise TypeError('Unsupported comment type')
+        return str(_QuizState(comment).carry(mino))
+
+    def _is_reparsable(self):
+        # Return whether _reparsed() gives parse_comment(str(self)): the quiz
+        # has an active mino, and the hold and active are only minos.
+        return bool(self._active) and not self._NON_MINO_PATTERN.search(
+            self._hold + self._active)
+
+    def _reparsed(self):
+        # Return parse_comment(str(self)) if self._is_reparsable().
+        # The string is '#Q=[hold](active)nexts;residue', which parses back
+        # to the same quiz, except that the minos in the residue are also
+        # added to the nexts.
+        return (True, self._hold, self._active,
+                self._nexts + self._NON_MINO_PATTERN.sub('', self._residue),
+                self._residue)
+
     def _split_nexts(self, split_index=1):
         """Return the split of nexts at split_index."""
         return (self._nexts[split_index-1:split_index],
@@ -56,7 +104,8 @@ class Quiz:
     def refresh(self):
         """Re-interpret the stored data as a quiz."""
         (self._is_valid, self._hold, self._active, self._nexts,
-            self._residue) = self.parse_comment(str(self))
+            self._residue) = (self._reparsed() if self._is_reparsable()
+                              else self._parse_cached(str(self)))
 
     def step(self, mino):
         """Modify the stored data according to the given mino and refresh.
@@ -112,3 +161,142 @@ class Quiz:
                             f';{self._residue}' if self._residue else ''])
         else:
             return self._residue
+
+class _QuizState:
+    # The comment carried over from page to page by the codec, kept as the
+    # state of its quiz, so that carrying it over takes constant time
+    # however long the next queue is. A state is either a plain comment,
+    # which is parsed when it is first carried over, or a parsed quiz.
+    # The nexts of a quiz are queue[start:end], where the queue list is
+    # shared with the states carried over from it, which only append to it.
+    # The comment string of a quiz is built when it is first needed.
+    __slots__ = ('_string', '_hold', '_active', '_queue', '_start', '_end',
+                 '_residue', '_residue_minos', '_carried')
+
+    def __init__(self, comment):
+        self._string = comment
+        self._hold = None
+        self._carried = None
+
+    @classmethod
+    def _quiz(cls, hold, active, queue, start, end, residue, residue_minos):
+        # Return the state of a parsed quiz
+        state = cls.__new__(cls)
+        state._string = None
+        state._hold = hold
+        state._active = active
+        state._queue = queue
+        state._start = start
+        state._end = end
+        state._residue = residue
+        state._residue_minos = residue_minos
+        state._carried = None
+        return state
+
+    @classmethod
+    def _parse(cls, comment):
+        # Return the state of the comment as Quiz(comment) reads it
+        if not comment.startswith('#Q='):
+            return cls(comment)
+        _, hold, active, nexts, residue = Quiz._parse_cached(comment)
+        return cls._quiz(hold, active, list(nexts), 0, len(nexts), residue,
+                         Quiz._NON_MINO_PATTERN.sub('', residue))
+
+    def _reparsed(self):
+        # Return the state of the quiz string parsed again, the same as
+        # Quiz.refresh(). The minos in the residue are added to the nexts.
+        if not self._active or Quiz._NON_MINO_PATTERN.search(
+                self._hold + self._active):
+            return self._parse(str(self))
+        if not self._residue_minos:
+            return self
+        queue = self._queue
+        start = self._start
+        if len(queue) != self._end:
+            # Another state has appended to the queue
+            queue = queue[start:self._end]
+            start = 0
+        queue += self._residue_minos
+        return self._quiz(self._hold, self._active, queue, start, len(queue),
+                          self._residue, self._residue_minos)
+
+    def _split_nexts(self, split_index):
+        # Return (active, start) after taking split_index minos of the nexts,
+        # the last of them being the new active mino
+        index = self._start + split_index - 1
+        active = self._queue[index] if index < self._end else ''
+        return active, min(self._start + split_index, self._end)
+
+    def _step(self, mino):
+        # Return the state of the quiz stepped by mino, as Quiz.step() does
+        if not mino.is_colored():
+            return self
+        name = mino.name
+        hold = self._hold
+        active = self._active
+        start = self._start
+        if name == active:
+            active, start = self._split_nexts(1)
+        elif name == hold:
+            hold = active
+            active, start = self._split_nexts(1)
+        elif start >= self._end:
+            raise IndexError('Quiz has no next mino')
+        elif name == self._queue[start]:
+            if not hold:
+                hold = active
+                active, start = self._split_nexts(2)
+            elif not active:
+                active, start = self._split_nexts(2)
+        return self._quiz(hold, active, self._queue, start, self._end,
+                          self._residue, self._residue_minos)._reparsed()
+
+    def carry(self, mino=None):
+        """Return the state of the comment carried over to the next page,
+        stepped by mino if it is given. The result is kept, so that carrying
+        a state over again with the same mino returns the same state.
+        """
+        carried = self._carried
+        if carried is not None and carried[0] is mino:
+            return carried[1]
+        if self._hold is None:
+            if not self._string.startswith('#Q='):
+                return self
+            state = self._parse(self._string)
+        else:
+            state = self._reparsed()
+        if mino is not None and state._hold is not None:
+            state = state._step(mino)
+        self._carried = (mino, state)
+        return state
+
+    def known_comment(self):
+        """Return the comment string if it is already built, otherwise the
+        state itself.
+        """
+        return self if self._string is None else self._string
+
+    def __len__(self):
+        """Return the length of the comment without building it."""
+        if self._string is not None:
+            return len(self._string)
+        if not self._active:
+            return len(self._residue)
+        return (len(self._hold) + len(self._active) + self._end - self._start
+                + 7 + (len(self._residue) + 1 if self._residue else 0))
+
+    def __eq__(self, other):
+        if not isinstance(other, _QuizState):
+            return NotImplemented
+        return self is other or str(self) == str(other)
+
+    def __str__(self):
+        if self._string is None:
+            if self._active:
+                nexts = ''.join(self._queue[self._start:self._end])
+                self._string = ''.join([
+                    f'#Q=[{self._hold}]({self._active}){nexts}',
+                    f';{self._residue}' if self._residue else ''])
+            else:
+                self._string = self._residue
+        return self._string
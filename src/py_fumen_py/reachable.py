@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+from .bit_field import BitField
+from .constant import FieldConstants as Consts
+from .operation import Mino, Rotation, Operation
+
+# SRS offset data of each rotation, kicks are the differences between them
+_JLSTZ_OFFSETS = {
+    Rotation.SPAWN: [(0, 0), (0, 0), (0, 0), (0, 0), (0, 0)],
+    Rotation.RIGHT: [(0, 0), (1, 0), (1, -1), (0, 2), (1, 2)],
+    Rotation.REVERSE: [(0, 0), (0, 0), (0, 0), (0, 0), (0, 0)],
+    Rotation.LEFT: [(0, 0), (-1, 0), (-1, -1), (0, 2), (-1, 2)],
+}
+
+_OFFSETS = {
+    Mino.I: {
+        Rotation.SPAWN: [(0, 0), (-1, 0), (2, 0), (-1, 0), (2, 0)],
+        Rotation.RIGHT: [(-1, 0), (0, 0), (0, 0), (0, 1), (0, -2)],
+        Rotation.REVERSE: [(-1, 1), (1, 1), (-2, 1), (1, 0), (-2, 0)],
+        Rotation.LEFT: [(0, 1), (0, 1), (0, 1), (0, -1), (0, 2)],
+    },
+    Mino.O: {
+        Rotation.SPAWN: [(0, 0)],
+        Rotation.RIGHT: [(0, -1)],
+        Rotation.REVERSE: [(-1, -1)],
+        Rotation.LEFT: [(-1, 0)],
+    },
+}
+
+# The searches run on boards of operation centers, with (x, y) at bit
+# y*WIDTH+x, so that each Rotation has one board of positions.
+_SPAWN_X = 4
+_SPAWN_Y = Consts.HEIGHT - 3
+_W = Consts.WIDTH
+_ALL = (1 << Consts.WIDTH*Consts.HEIGHT) - 1
+_COLUMNS = [sum(1 << y*Consts.WIDTH+x for y in range(Consts.HEIGHT))
+            for x in range(Consts.WIDTH)]
+# _COLUMNS_FROM[n]: columns x >= n, _COLUMNS_BELOW[n]: columns x < n
+_COLUMNS_FROM = [sum(_COLUMNS[n:]) for n in range(Consts.WIDTH+1)]
+_COLUMNS_BELOW = [sum(_COLUMNS[:n]) for n in range(Consts.WIDTH+1)]
+
+_kicks = {}
+
+def _shift(board, dx, dy):
+    # Move every position of the board by (dx, dy), dropping the positions
+    # moved out of the field instead of wrapping them to the next line.
+    shift = dy * _W + dx
+    board = board << shift if shift >= 0 else board >> -shift
+    if dx > 0:
+        board &= _COLUMNS_FROM[min(dx, _W)]
+    elif dx < 0:
+        board &= _COLUMNS_BELOW[max(_W+dx, 0)]
+    return board & _ALL
+
+def _fill(board, propagator, dx, dy):
+    # Extend the board by repeated (dx, dy) moves within the propagator
+    # positions (Kogge-Stone occluded fill).
+    if dx > 0:
+        propagator &= _COLUMNS_FROM[dx]
+    elif dx < 0:
+        propagator &= _COLUMNS_BELOW[_W+dx]
+    for n in (1, 2, 4, 8, 16):
+        board |= propagator & _shift(board, dx*n, dy*n)
+        propagator &= _shift(propagator, dx*n, dy*n)
+    return board
+
+def _get_kicks(mino):
+    # Return the kicks of mino, kicks[rotation] being a list of
+    # (rotated, [(dx, dy), ...]) for the clockwise and counterclockwise
+    # rotations in testing order. Rotations in the Rotation numbering go
+    # clockwise as the value decreases.
+    kicks = _kicks.get(mino)
+    if kicks is None:
+        offsets = _OFFSETS.get(mino, _JLSTZ_OFFSETS)
+        kicks = _kicks[mino] = {
+            rotation: [
+                (rotated, [(fx-tx, fy-ty) for (fx, fy), (tx, ty)
+                           in zip(offsets[rotation], offsets[rotated])])
+                for rotated in (rotation.shifted(-1), rotation.shifted(1))
+            ]
+            for rotation in Rotation
+        }
+    return kicks
+
+def _free_cells(field):
+    # Return the board of empty cells in the playing field
+    if isinstance(field, BitField):
+        return ~(field._occupied >> Consts.GARBAGE_HEIGHT*_W) & _ALL
+    free = 0
+    for y in range(Consts.HEIGHT):
+        for x, mino in enumerate(field._line(y)):
+            if mino is Mino._:
+                free |= 1 << y*_W+x
+    return free
+
+def reachable_operations(field, mino, spawn=None):
+    """Return every distinct placement of mino reachable from the spawn.
+    The mino can be shifted left and right, soft dropped, and rotated with
+    SRS kicks. Placements occupying the same cells are only returned once.
+    Keyword arguments:
+    field: the Field or BitField to search on.
+    mino: the colored Mino to place.
+    spawn: the starting Operation, None for the mino in spawn rotation at
+        (4, HEIGHT-3). (default: None)
+    """
+    if spawn is None:
+        spawn = Operation(mino, Rotation.SPAWN, _SPAWN_X, _SPAWN_Y)
+    if not (mino.is_colored() and field.is_placeable(spawn)):
+        return []
+
+    # Positions where each rotation fits
+    free = _free_cells(field)
+    fits = {}
+    for rotation in Rotation:
+        fit = _ALL
+        for dx, dy in Operation._shape_entry(mino, rotation, 0, 0)[0]:
+            fit &= _shift(free, -dx, -dy)
+        fits[rotation] = fit
+
+    # Flood fill the positions by shifts and drops, then by rotations with
+    # kicks, until nothing changes
+    kicks = _get_kicks(mino)
+    reached = {rotation: 0 for rotation in Rotation}
+    reached[Rotation(spawn.rotation)] = 1 << spawn.y*_W+spawn.x
+    pending = {Rotation(spawn.rotation)}
+    while pending:
+        rotation = pending.pop()
+        fit = fits[rotation]
+        board = reached[rotation]
+        while True:
+            previous = board
+            board = _fill(board, fit, 0, -1)
+            board = _fill(board, fit, -1, 0)
+            board = _fill(board, fit, 1, 0)
+            if board == previous:
+                break
+        reached[rotation] = board
+
+        for rotated, rotation_kicks in kicks[rotation]:
+            # Only the first fitting kick is taken from each position
+            remaining = board
+            rotated_board = reached[rotated]
+            for dx, dy in rotation_kicks:
+                kicked = remaining & _shift(fits[rotated], -dx, -dy)
+                remaining &= ~kicked
+                rotated_board |= _shift(kicked, dx, dy)
+            if rotated_board != reached[rotated]:
+                reached[rotated] = rotated_board
+                pending.add(rotated)
+
+    # Keep the positions that cannot be dropped further
+    operations = []
+    masks = set()
+    for rotation in Rotation:
+        grounded = reached[rotation] & ~_shift(fits[rotation], 0, 1)
+        while grounded:
+            position = (grounded & -grounded).bit_length() - 1
+            grounded &= grounded - 1
+            y, x = divmod(position, _W)
+            operation = Operation(mino, rotation, x, y)
+            mask = operation.mask()
+            if mask not in masks:
+                masks.add(mask)
+                operations.append(operation)
+    return operations
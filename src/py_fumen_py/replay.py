@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from .bit_field import BitField
+from .constant import FieldConstants as Consts
+
+# The boards use the BitField layout, with grid (x, y) at bit
+# (y+GARBAGE_HEIGHT)*WIDTH+x, the garbage line(s) taking the lowest bits.
+_W = Consts.WIDTH
+_GARBAGE_BITS = Consts.GARBAGE_HEIGHT * Consts.WIDTH
+_BOARD_MASK = BitField._BOARD_MASK
+# The first column of every line of the playing field
+_FIELD_ROW_STARTS = sum(1 << (y+Consts.GARBAGE_HEIGHT)*_W
+                        for y in range(Consts.HEIGHT))
+
+def _full_rows(occupied):
+    # Return the board with the first bit of each filled line of the
+    # playing field set, by checking WIDTH consecutive bits at once
+    full = occupied & (occupied >> 1)
+    full &= full >> 2
+    full &= full >> 4
+    full &= full >> _W-8
+    return full & _FIELD_ROW_STARTS
+
+def _clear_rows(boards, full):
+    # Remove the filled lines from each board in place, from the top one
+    # down, moving the lines above them down
+    while full:
+        shift = full.bit_length() - 1
+        full ^= 1 << shift
+        low = (1 << shift) - 1
+        for i, board in enumerate(boards):
+            boards[i] = (board & low) | (board >> _W >> shift << shift)
+
+def _rise(boards):
+    # Move the garbage line(s) into the bottom of the playing field
+    for i, board in enumerate(boards):
+        boards[i] = (board << _GARBAGE_BITS) & _BOARD_MASK
+
+def _mirror(boards):
+    # Mirror the lines of the playing field of each board
+    for i, board in enumerate(boards):
+        result = board & BitField._GARBAGE_MASK
+        for shift in range(_GARBAGE_BITS, Consts.TOTAL_BLOCK_COUNT, _W):
+            row = (board >> shift) & BitField._ROW_MASK
+            if row:
+                result |= BitField._REVERSED_ROWS[row] << shift
+        boards[i] = result
+
+def _to_field(boards, bit_field):
+    # Return the boards as a new field of the same type as bit_field
+    result = BitField.__new__(BitField)
+    result._occupied = boards[0]
+    result._planes = boards[1:]
+    return result if bit_field else result.to_field()
+
+def replay(field, actions, intermediate=False):
+    """Apply the actions on a copy of the field, the same as calling
+    apply_action() for each of them, and return the resulting field.
+    The actions are applied on bitboards: filled lines are found with masks
+    and removed by shifting the boards, and the work of the flags that are
+    not set is skipped. The field is only converted back at the end, unless
+    the intermediate fields are requested.
+    Keyword arguments:
+    field: the Field or BitField to start from, which is not modified.
+    actions: an iterable of Action objects.
+    intermediate: if a list of the fields after each action should be
+        returned instead. (default: False)
+    """
+    bit_field = isinstance(field, BitField)
+    start = field if bit_field else BitField.from_field(field)
+    # boards[0] is the occupancy, followed by the colour planes
+    boards = [start._occupied, *start._planes]
+    fields = []
+
+    for action in actions:
+        if action.lock:
+            operation = action.operation
+            mino = operation.mino
+            if mino.is_colored():
+                mask = operation.mask()
+                if mask is None or mask & boards[0]:
+                    raise ValueError(
+                        f'operation cannot be locked: {operation}')
+                boards[0] |= mask
+                for i in range(BitField._PLANE_COUNT):
+                    if (mino >> i) & 1:
+                        boards[i+1] |= mask
+
+            full = _full_rows(boards[0])
+            if full:
+                _clear_rows(boards, full)
+            if action.rise:
+                _rise(boards)
+            if action.mirror:
+                _mirror(boards)
+        if intermediate:
+            fields.append(_to_field(boards, bit_field))
+
+    return fields if intermediate else _to_field(boards, bit_field)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from py_fumen_py.bit_field import BitField
+from py_fumen_py.field import Field
+from py_fumen_py.operation import Mino, Rotation, Operation
+
+def test_line_taken_before_copy_modifies_only_its_field():
+    field = Field()
+    line = field[0]
+    copy = field.copy()
+    line[0] = Mino.I
+    assert field.at(0, 0) is Mino.I
+    assert copy.at(0, 0) is Mino._
+
+def test_line_of_copy_modifies_only_the_copy():
+    field = Field()
+    copy = field.copy()
+    copy[0][3] = Mino.T
+    assert copy.at(3, 0) is Mino.T
+    assert field.at(3, 0) is Mino._
+
+def test_reading_lines_keeps_sharing():
+    field = Field(field='IIII')
+    copy = field.copy()
+    assert [mino for mino in copy[0]][:4] == [Mino.I] * 4
+    assert copy[0][0] is Mino.I
+    assert copy._field is field._field
+
+def test_assigned_line_is_copied():
+    field = Field()
+    line = [Mino.O] * 10
+    field[1] = line
+    line[0] = Mino._
+    assert field.at(0, 1) is Mino.O
+
+def test_line_slices():
+    field = Field()
+    field[0][2:5] = [Mino.L, Mino.L, Mino.L]
+    assert field[0][:6] == [Mino._, Mino._, Mino.L, Mino.L, Mino.L, Mino._]
+    assert field[0] == field.copy()[0]
+
+def test_lock_through_line_views():
+    field = Field()
+    field.lock(Operation(Mino.T, Rotation.SPAWN, 4, 0))
+    assert field[0][3:6] == [Mino.T] * 3
+    assert field[1][4] is Mino.T
+
+def _scanned_columns(field):
+    return [sum(1 << y for y in range(len(field._field))
+                if field.at(x, y) is not Mino._) for x in range(10)]
+
+def test_lock_updates_cached_columns():
+    field = Field(field='X_XXXXXXXX')
+    assert field.column_heights() == [1, 0] + [1] * 8
+    copy = field.copy()
+    field.lock(Operation(Mino.I, Rotation.LEFT, 1, 2))
+    assert field._columns is not None
+    assert field._column_masks() == _scanned_columns(field)
+    assert copy._column_masks() == _scanned_columns(copy)
+    assert field.drop(Operation(Mino.O, Rotation.SPAWN, 4, 20)).y == 1
+
+def test_field_is_not_hashable():
+    with pytest.raises(TypeError):
+        hash(Field())
+
+def test_frozen_field_has_its_own_lines():
+    field = Field(field='TTT_______')
+    field.zobrist_hash()
+    frozen = field.frozen()
+    frozen_hash = hash(frozen)
+    field.fill(5, 0, Mino.I)
+    field[0][6] = Mino.O
+    assert frozen.at(5, 0) is Mino._
+    assert frozen.at(6, 0) is Mino._
+    assert frozen == Field(field='TTT_______')
+    assert hash(frozen) == frozen_hash
+    assert {frozen: 1}[Field(field='TTT_______').frozen()] == 1
+    with pytest.raises(TypeError):
+        frozen.fill(0, 0, Mino.I)
+
+def test_rise_moves_the_garbage_into_the_field():
+    field = Field(field='TTT_______', garbage='XXXXXXXXX_')
+    hash_ = field.zobrist_hash()
+    field.rise()
+    expected = Field(field='TTT_______\nXXXXXXXXX_')
+    assert field == expected
+    assert field.zobrist_hash() == expected.zobrist_hash() != hash_
+    bit_field = BitField.from_field(
+        Field(field='TTT_______', garbage='XXXXXXXXX_'))
+    bit_field.rise()
+    assert bit_field.to_field() == field
+
+def test_line_writes_update_the_hash():
+    field = Field(field='TTT_______')
+    other = field.copy()
+    field.zobrist_hash()
+    field[0][3] = Mino.T
+    other.fill(3, 0, Mino.T)
+    assert field == other
+    assert field.zobrist_hash() == Field(field='TTTT______').zobrist_hash()
+
+def test_line_views_give_lists():
+    field = Field(field='IIII______')
+    line = field[0]
+    assert not isinstance(line, list)
+    assert line[:2] == [Mino.I] * 2 and isinstance(line[:2], list)
+    copied = line.copy()
+    copied[0] = Mino.T
+    assert field.at(0, 0) is Mino.I
+    assert line + [Mino.O] == [Mino.I] * 4 + [Mino._] * 6 + [Mino.O]
+    assert [Mino.O] + line == [Mino.O] + [Mino.I] * 4 + [Mino._] * 6
+    assert len(line + field[1]) == 20
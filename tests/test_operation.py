@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from py_fumen_py.operation import Mino, Rotation, Operation
+
+def test_shape_returns_new_lists():
+    operation = Operation(Mino.T, Rotation.SPAWN, 4, 0)
+    shape = operation.shape()
+    assert shape == [[4, 0], [3, 0], [5, 0], [4, 1]]
+    shape[0][1] += 1
+    shape.append([0, 0])
+    assert operation.shape() == [[4, 0], [3, 0], [5, 0], [4, 1]]
+    assert Operation.shape_at(Mino.T, Rotation.SPAWN, 4, 0) == [
+        [4, 0], [3, 0], [5, 0], [4, 1]]
+    assert operation.is_inside()
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from py_fumen_py.field import Field
+from py_fumen_py.operation import Mino
+from py_fumen_py.page import Page
+from py_fumen_py.page_store import PageStore, PageStoreWriter
+
+def test_field_edited_in_place_between_pages(tmp_path):
+    path = str(tmp_path / 'pages.store')
+    field = Field()
+    with open(path, 'wb') as sink, PageStoreWriter(sink) as writer:
+        writer.add_page(Page(field=field))
+        field.fill(0, 0, Mino.I)
+        writer.add_page(Page(field=field))
+        field[0][1] = Mino.T
+        writer.add_page(Page(field=field))
+
+    with PageStore(path) as store:
+        assert store[0].field.at(0, 0) is Mino._
+        assert store[1].field.at(0, 0) is Mino.I
+        assert store[1].field.at(1, 0) is Mino._
+        assert store[2].field.at(1, 0) is Mino.T
+        assert store.field_block(-1)[11] == Mino.T
+
+def test_field_block_index_out_of_range(tmp_path):
+    path = str(tmp_path / 'pages.store')
+    with open(path, 'wb') as sink, PageStoreWriter(sink) as writer:
+        writer.add_page(Page(field=Field()))
+
+    with PageStore(path) as store:
+        assert len(store.field_block(0)) == 240
+        with pytest.raises(IndexError):
+            store.field_block(1)
+        with pytest.raises(IndexError):
+            store.field_block(-2)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import random
+import time
+
+from py_fumen_py.field import Field
+from py_fumen_py.fumen_codec import decode, encode
+from py_fumen_py.operation import Mino, Rotation, Operation
+from py_fumen_py.page import Page, Flags
+from py_fumen_py.quiz import Quiz, _QuizState
+
+def _quiz_pages(queue, residue):
+    # Return pages locking the minos of the queue in order, with the comments
+    # of the quiz carried over by Quiz
+    comment = f'#Q=[]({queue[0]}){queue[1:]};{residue}'
+    pages = []
+    for name in queue[:-1]:
+        pages.append(Page(field=Field(),
+                          operation=Operation(Mino[name], Rotation.SPAWN, 4,
+                                              0),
+                          comment=comment, flags=Flags()))
+        quiz = Quiz(comment)
+        quiz.step(Mino[name])
+        comment = str(quiz)
+    return pages
+
+def test_decoded_quiz_comments_are_carried():
+    rng = random.Random(0)
+    queue = ''.join(rng.choice('IOLZTJS') for i in range(40))
+    pages = _quiz_pages(queue, 'hold an I')
+    string = encode(pages)
+    decoded = decode(string)
+    assert ([page.comment for page in decoded]
+            == [page.comment for page in pages])
+    assert encode(decode(string)) == string
+
+def _carry_time(queue, count):
+    # Return the best time of carrying a quiz of the queue over count pages
+    minos = [Mino[name] for name in queue[:count]]
+    best = None
+    for i in range(5):
+        state = _QuizState(f'#Q=[]({queue[0]}){queue[1:]}').carry()
+        start = time.perf_counter()
+        for mino in minos:
+            state = state.carry(mino)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert str(state) == f'#Q=[]({queue[count]}){queue[count+1:]}'
+    return best
+
+def test_carry_cost_does_not_grow_with_the_queue():
+    queue = 'IOLZTJS' * 3000
+    short_time = _carry_time(queue[:210], 200)
+    long_time = _carry_time(queue, 200)
+    assert long_time < short_time * 3